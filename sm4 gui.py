@@ -16,6 +16,7 @@ from customtkinter import (
     CTkFrame,
     CTkSegmentedButton,
     CTkScrollableFrame,
+    CTkCheckBox,
 )
 
 from sm4_core import (
@@ -24,9 +25,16 @@ from sm4_core import (
     generate_key,
     load_key_hex,
     load_key,
-    SM4,
+    get_cipher,
     parse_hex_string,
     format_hex_block,
+    WrongKeyError,
+)
+from sm4_files import (
+    check_encrypted_file,
+    decrypt_file_sparse,
+    encrypt_file_sparse,
+    verify_encrypted_file,
 )
 
 ctk.set_appearance_mode("light")
@@ -453,6 +461,8 @@ class SM4App(ctk.CTk):
         segmented.pack(side="right", padx=(0, 12), pady=8)
 
         self.padding_mode_global = ctk.StringVar(value="PKCS#7")
+        self.file_header_enabled = ctk.BooleanVar(value=False)
+        self.full_verify_enabled = ctk.BooleanVar(value=False)
 
         self.content = CTkScrollableFrame(main, fg_color=self.bg_color)
         self.content.pack(fill="both", expand=True)
@@ -1076,11 +1086,7 @@ class SM4App(ctk.CTk):
                     )
                     return
                 # Блочне шифрування
-                cipher = SM4(key)
-                out = bytearray()
-                for i in range(0, len(data), 16):
-                    out.extend(cipher.encrypt_block(data[i:i+16]))
-                ct = bytes(out)
+                ct = get_cipher(key).encrypt_blocks(data)
             self.text_output.configure(state="normal")
             self.text_output.delete("1.0", "end")
             self.text_output.insert("1.0", ct.hex())
@@ -1154,11 +1160,7 @@ class SM4App(ctk.CTk):
                         "Для режиму без доповнення довжина шифртексту повинна бути кратною 16 байтам."
                     )
                     return
-                cipher = SM4(key)
-                out = bytearray()
-                for i in range(0, len(ct), 16):
-                    out.extend(cipher.decrypt_block(ct[i:i+16]))
-                pt = bytes(out)
+                pt = get_cipher(key).decrypt_blocks(ct)
 
             self.text_output.configure(state="normal")
             self.text_output.delete("1.0", "end")
@@ -1266,6 +1268,35 @@ class SM4App(ctk.CTk):
             " • PKCS#7 — авто-доповнення до 16 байт\n"
             " • Немає — без доповнення (кратно 16)"
         )
+        CTkCheckBox(
+            pad_local_files,
+            text="Заголовок",
+            variable=self.file_header_enabled,
+            font=("Segoe UI", 11, "bold"),
+        ).pack(side="left", padx=(6, 0))
+        header_help_f = CTkLabel(pad_local_files, text="❓", font=("Segoe UI", 10))
+        header_help_f.pack(side="left", padx=6)
+        create_tooltip(
+            header_help_f,
+            "Заголовок файлу (лише режим «Файл цілком»):\n"
+            " • зберігає доповнення й довжину файлу та контрольне значення ключа;\n"
+            " • неправильний ключ виявляється одразу, без розшифрування;\n"
+            " • розшифрування визначає заголовок автоматично."
+        )
+        CTkCheckBox(
+            pad_local_files,
+            text="Повна перевірка",
+            variable=self.full_verify_enabled,
+            font=("Segoe UI", 11, "bold"),
+        ).pack(side="left", padx=(6, 0))
+        verify_help_f = CTkLabel(pad_local_files, text="❓", font=("Segoe UI", 10))
+        verify_help_f.pack(side="left", padx=6)
+        create_tooltip(
+            verify_help_f,
+            "Перевірка після шифрування (лише режим «Файл цілком»):\n"
+            " • за замовчуванням розшифровуються 512 випадкових блоків і останній блок;\n"
+            " • повна перевірка розшифровує й порівнює весь файл (удвічі довше)."
+        )
 
         mode_row = CTkFrame(pad_local_files, fg_color=self.bg_color)
         mode_row.pack(side="right")
@@ -1645,8 +1676,56 @@ class SM4App(ctk.CTk):
                     # Мапимо байти шифртексту у текст через latin-1, щоб зберегти у UTF-8-файлі
                     ct_encode = lambda b: b.decode("latin-1")
             else:
-                data = self.enc_file.read_bytes()
-                ct_encode = None
+                # Файл шифрується потоково, без читання в пам'ять; дірки розріджених файлів не читаються
+                padding = self.padding_mode_global.get() == "PKCS#7"
+                if not padding and self.enc_file.stat().st_size % 16 != 0:
+                    messagebox.showerror(
+                        "Некоректна довжина",
+                        "Без доповнення довжина файлу повинна бути кратною 16 байтам."
+                    )
+                    return
+                out = self._choose_output_path_encrypt()
+                if out is None:
+                    return
+                if out.resolve() == self.enc_file.resolve():
+                    messagebox.showerror(
+                        "Некоректний шлях",
+                        "Файл результату не може збігатися з вихідним файлом.",
+                    )
+                    return
+                encrypt_file_sparse(
+                    self.enc_file, out, self.enc_key,
+                    padding=padding, header=self.file_header_enabled.get(),
+                )
+                # Вибіркова (або повна) перевірка: розшифровуються випадкові блоки й останній блок
+                try:
+                    report = verify_encrypted_file(
+                        self.enc_file, out, self.enc_key,
+                        full=self.full_verify_enabled.get(), padding=padding,
+                    )
+                    problem = (
+                        f"{report['mismatches']} із {report['checked']} перевірених блоків "
+                        "не збігаються з вихідним файлом."
+                        if report["mismatches"] else None
+                    )
+                except ValueError as exc:
+                    problem = str(exc)
+                if problem:
+                    # Пошкоджений шифртекст не залишаємо, щоб його не прийняли за коректний результат
+                    out.unlink(missing_ok=True)
+                    messagebox.showerror(
+                        "Помилка перевірки",
+                        f"Зашифрований файл {out.name} не пройшов перевірку:\n{problem}\n\n"
+                        "Файл результату видалено. Спробуйте зашифрувати ще раз.",
+                    )
+                    return
+                messagebox.showinfo(
+                    "Шифрування файлу виконано",
+                    f"Файл успішно зашифровано.\n\nРезультат збережено як:\n{out.name}\n\n"
+                    f"Перевірено блоків: {report['checked']} із {report['blocks']} "
+                    f"(достовірність {report['confidence']:.2%}).",
+                )
+                return
             if self.padding_mode_global.get() == "PKCS#7":
                 ct = sm4_encrypt_ecb(data, self.enc_key)
             else:
@@ -1656,19 +1735,12 @@ class SM4App(ctk.CTk):
                         "Без доповнення довжина файлу повинна бути кратною 16 байтам."
                     )
                     return
-                cipher = SM4(self.enc_key)
-                out = bytearray()
-                for i in range(0, len(data), 16):
-                    out.extend(cipher.encrypt_block(data[i:i+16]))
-                ct = bytes(out)
+                ct = get_cipher(self.enc_key).encrypt_blocks(data)
             # Запитати користувача про спосіб збереження
             out = self._choose_output_path_encrypt()
             if out is None:
                 return
-            if content_mode:
-                out.write_text(ct_encode(ct), encoding="utf-8")
-            else:
-                out.write_bytes(ct)
+            out.write_text(ct_encode(ct), encoding="utf-8")
             messagebox.showinfo(
                 "Шифрування файлу виконано",
                 f"Файл успішно зашифровано.\n\nРезультат збережено як:\n{out.name}",
@@ -1732,19 +1804,36 @@ class SM4App(ctk.CTk):
             key = self.enc_key
 
         try:
-            ct_raw = file_path.read_text(encoding="utf-8") if content_mode else file_path.read_bytes()
-            if content_mode:
-                if self.content_data_format == "hex":
-                    try:
-                        ct = parse_hex_string(ct_raw)
-                    except ValueError as exc:
-                        messagebox.showerror("Некоректний HEX", str(exc))
-                        return
-                else:
-                    # Шифртекст збережено як текст, кожен байт через latin-1, файл у UTF-8
-                    ct = ct_raw.encode("latin-1")
+            # Файл із заголовком сам описує доповнення; без заголовка діє перемикач PKCS#7/Немає
+            if not content_mode:
+                padding = self.padding_mode_global.get() == "PKCS#7"
+                # Ключ перевіряється (KCV або останній блок) до вибору шляху й створення файлу результату
+                check_encrypted_file(file_path, key, padding=padding)
+                out = self._choose_output_path_decrypt(file_path)
+                if out is None:
+                    return
+                if out.resolve() == file_path.resolve():
+                    messagebox.showerror(
+                        "Некоректний шлях",
+                        "Файл результату не може збігатися з вихідним файлом.",
+                    )
+                    return
+                decrypt_file_sparse(file_path, out, key, padding=padding)
+                messagebox.showinfo(
+                    "Розшифрування файлу виконано",
+                    f"Файл успішно розшифровано.\n\nРезультат збережено як:\n{out.name}",
+                )
+                return
+            ct_raw = file_path.read_text(encoding="utf-8")
+            if self.content_data_format == "hex":
+                try:
+                    ct = parse_hex_string(ct_raw)
+                except ValueError as exc:
+                    messagebox.showerror("Некоректний HEX", str(exc))
+                    return
             else:
-                ct = ct_raw
+                # Шифртекст збережено як текст, кожен байт через latin-1, файл у UTF-8
+                ct = ct_raw.encode("latin-1")
             if self.padding_mode_global.get() == "PKCS#7":
                 pt_bytes = sm4_decrypt_ecb(ct, key)
             else:
@@ -1754,32 +1843,30 @@ class SM4App(ctk.CTk):
                         "Без доповнення довжина шифртексту повинна бути кратною 16 байтам."
                     )
                     return
-                cipher = SM4(key)
-                outb = bytearray()
-                for i in range(0, len(ct), 16):
-                    outb.extend(cipher.decrypt_block(ct[i:i+16]))
-                pt_bytes = bytes(outb)
-            if content_mode:
-                if self.content_data_format == "hex":
-                    output_text = format_hex_block(pt_bytes)
-                else:
-                    try:
-                        output_text = pt_bytes.decode("utf-8")
-                    except UnicodeDecodeError:
-                        output_text = pt_bytes.decode("utf-8", errors="replace")
+                pt_bytes = get_cipher(key).decrypt_blocks(ct)
+            if self.content_data_format == "hex":
+                output_text = format_hex_block(pt_bytes)
+            else:
+                try:
+                    output_text = pt_bytes.decode("utf-8")
+                except UnicodeDecodeError:
+                    output_text = pt_bytes.decode("utf-8", errors="replace")
             # Запитати користувача про спосіб збереження
             out = self._choose_output_path_decrypt(file_path)
             if out is None:
                 return
-            if content_mode:
-                out.write_text(output_text, encoding="utf-8")
-            else:
-                out.write_bytes(pt_bytes)
-            extra = " (HEX-рядок)" if content_mode and self.content_data_format == "hex" else (" (UTF-8)" if content_mode else "")
+            out.write_text(output_text, encoding="utf-8")
+            extra = " (HEX-рядок)" if self.content_data_format == "hex" else " (UTF-8)"
             messagebox.showinfo(
                 "Розшифрування файлу виконано",
                 f"Файл успішно розшифровано{extra}.\n\nРезультат збережено як:\n{out.name}",
             )
+        except WrongKeyError as e:
+            # Причина залежить від перевірки: KCV у заголовку або доповнення останнього блоку
+            messagebox.showerror(
+                "Неправильний ключ",
+                f"{e}\n\nФайл результату не створено.",
+            )
         except Exception as e:
             messagebox.showerror(
                 "Помилка розшифрування файлу",
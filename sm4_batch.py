@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+
+from sm4_core import DEFAULT_ENGINE, EXECUTORS, WrongKeyError, _resolve_executor, load_key
+from sm4_files import _NEW_FILE_MODE, encrypt_file_sparse, key_check_value
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+MANIFEST_NAME = ".sm4-manifest.json"
+MANIFEST_VERSION = 1
+_DIGEST_READ_SIZE = 1 << 20
+# Скільки завдань передається процесу за раз: мільйони дрібних файлів не впираються в IPC
+_BATCH_SIZE = 64
+
+_Job = Tuple[str, str, bytes, str, bool, Optional[str]]
+
+
+def _digest_key(key: bytes) -> bytes:
+    # Дайджест у маніфесті ключовий: за ним не можна перевірити здогадку про вміст файлу
+    return hmac.new(key, b"sm4-batch digest", hashlib.sha256).digest()
+
+
+def file_digest(path: PathLike, digest_key: bytes) -> str:
+    """HMAC-SHA256 вмісту файлу, що читається частинами."""
+    mac = hmac.new(digest_key, digestmod=hashlib.sha256)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_DIGEST_READ_SIZE), b""):
+            mac.update(block)
+    return mac.hexdigest()
+
+
+def _encrypt_job(job: _Job) -> Tuple[Optional[str], bool, Optional[OSError]]:
+    """Дайджест і, якщо вміст змінився, шифрування у тимчасовий файл з атомарною заміною.
+
+    Помилка введення-виведення повертається третім елементом, а не піднімається: один нечитабельний
+    файл не повинен зупиняти решту пакета.
+    """
+    src, dst, key, engine, header, old_digest = job
+    try:
+        digest = file_digest(src, _digest_key(key))
+        if digest == old_digest and os.path.exists(dst):
+            return digest, False, None
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        # Унікальне ім'я від mkstemp: "dst + .tmp" могло б збігтися з результатом іншого файлу джерела
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".sm4-", suffix=".tmp")
+        os.close(fd)
+        try:
+            encrypt_file_sparse(src, tmp, key, engine, header=header)
+            os.chmod(tmp, _NEW_FILE_MODE)
+            os.replace(tmp, dst)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        return None, False, e
+    return digest, True, None
+
+
+def _encrypt_batch(jobs: List[_Job]) -> List[Tuple[Optional[str], bool, Optional[OSError]]]:
+    """Завдання пулу: кілька файлів за один виклик."""
+    return [_encrypt_job(job) for job in jobs]
+
+
+def _walk(root: Path, skip: Path, onerror: Callable[[OSError], None]):
+    for dirpath, dirnames, filenames in os.walk(root, onerror=onerror):
+        base = Path(dirpath)
+        # Каталог результатів усередині джерела не шифрується повторно
+        dirnames[:] = sorted(d for d in dirnames if (base / d).resolve() != skip)
+        for name in sorted(filenames):
+            yield base / name
+
+
+def encrypt_directory(
+    src_dir: PathLike,
+    dst_dir: PathLike,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = None,
+    executor: str = "auto",
+    header: bool = True,
+    prune: bool = False,
+    onerror: Optional[Callable[[str, OSError], None]] = None,
+) -> Dict[str, int]:
+    """Інкрементне шифрування каталогу src_dir у dst_dir зі збереженням структури.
+
+    Маніфест dst_dir/.sm4-manifest.json зберігає для кожного файлу розмір, mtime, ключовий
+    дайджест вмісту й шлях результату. Файли з незмінними розміром і mtime пропускаються без
+    читання; файли зі зміненим mtime, але тим самим дайджестом, не шифруються повторно.
+    Нові й змінені файли шифруються (ECB, PKCS#7, за замовчуванням із заголовком) у пулі
+    потоків чи процесів. prune=True видаляє результати файлів, яких більше немає в джерелі.
+
+    Помилка читання чи запису окремого файлу не перериває обробку: файл рахується як невдалий,
+    onerror(відносний шлях, OSError) викликається для нього, а маніфест його не оновлює. Якщо не
+    вдалося прочитати якийсь каталог джерела, prune не виконується.
+    Повертає кількість пропущених, зашифрованих, перевірених без змін, видалених і невдалих файлів.
+    """
+    src_dir = Path(src_dir)
+    dst_dir = Path(dst_dir)
+    if dst_dir.resolve() == src_dir.resolve():
+        raise ValueError("Каталог результатів не може збігатися з каталогом джерела.")
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = dst_dir / MANIFEST_NAME
+    kcv = key_check_value(key, engine).hex()
+    files: Dict[str, Dict] = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Непідтримувана версія маніфесту: {manifest.get('version')}.")
+        if manifest["kcv"] != kcv:
+            raise WrongKeyError(
+                "Каталог результатів зашифровано іншим ключем — контрольне значення ключа не збігається."
+            )
+        files = manifest["files"]
+
+    stats = {"skipped": 0, "encrypted": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    walk_failed = False
+
+    def fail(rel: str, error: OSError) -> None:
+        stats["failed"] += 1
+        if onerror is not None:
+            onerror(rel, error)
+
+    def walk_error(error: OSError) -> None:
+        nonlocal walk_failed
+        walk_failed = True
+        fail(os.path.relpath(error.filename, src_dir) if error.filename else str(src_dir), error)
+
+    seen = set()
+    jobs = []
+    pending = []
+    for path in _walk(src_dir, dst_dir.resolve(), walk_error):
+        rel = path.relative_to(src_dir).as_posix()
+        if rel == MANIFEST_NAME:
+            raise ValueError(
+                f"Файл джерела {rel} збігається з назвою маніфесту в каталозі результатів.\n"
+                "Перейменуйте його або оберіть інший каталог."
+            )
+        # Файл з помилкою теж вважається наявним: prune не видаляє його попередній результат
+        seen.add(rel)
+        try:
+            st = path.stat()
+        except OSError as e:
+            fail(rel, e)
+            continue
+        entry = files.get(rel)
+        out = dst_dir / rel
+        if (
+            entry is not None
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+            and out.exists()
+        ):
+            stats["skipped"] += 1
+            continue
+        jobs.append((str(path), str(out), key, engine, header, entry["digest"] if entry else None))
+        pending.append((rel, st))
+
+    try:
+        if jobs:
+            kind = _resolve_executor(executor, engine)
+            pool_cls = ThreadPoolExecutor if kind == "thread" else ProcessPoolExecutor
+            with pool_cls(max_workers=workers) as pool:
+                batch = _BATCH_SIZE if kind == "process" else 1
+                futures = {
+                    pool.submit(_encrypt_batch, jobs[i:i + batch]): pending[i:i + batch]
+                    for i in range(0, len(jobs), batch)
+                }
+                # Результати записуються в маніфест у порядку завершення: перерваний запуск не втрачає готових файлів
+                for future in as_completed(futures):
+                    for (rel, st), (digest, encrypted, error) in zip(futures[future], future.result()):
+                        if error is not None:
+                            fail(rel, error)
+                            continue
+                        files[rel] = {
+                            "size": st.st_size,
+                            "mtime_ns": st.st_mtime_ns,
+                            "digest": digest,
+                            "output": rel,
+                        }
+                        stats["encrypted" if encrypted else "unchanged"] += 1
+        if prune and not walk_failed:
+            for rel in sorted(set(files) - seen):
+                out = dst_dir / files.pop(rel)["output"]
+                if out.exists():
+                    out.unlink()
+                stats["removed"] += 1
+    finally:
+        # Маніфест зберігається й після переривання: завершені файли не шифруватимуться знову
+        fd, tmp = tempfile.mkstemp(dir=dst_dir, prefix=".sm4-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "kcv": kcv,
+                "files": files,
+            }, f)
+        os.chmod(tmp, _NEW_FILE_MODE)
+        os.replace(tmp, manifest_path)
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Інкрементне шифрування каталогу SM4: шифруються лише нові та змінені файли.",
+    )
+    parser.add_argument("src", help="каталог з вихідними файлами")
+    parser.add_argument("dst", help="каталог для зашифрованих файлів і маніфесту")
+    parser.add_argument("-k", "--key-file", required=True, help="файл ключа (HEX або бінарний)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="кількість паралельних виконавців")
+    parser.add_argument("--executor", choices=EXECUTORS, default="auto", help="пул потоків або процесів")
+    parser.add_argument("--no-header", action="store_true", help="не додавати заголовок до файлів")
+    parser.add_argument("--prune", action="store_true", help="видаляти результати видалених файлів")
+    args = parser.parse_args(argv)
+
+    def report(rel: str, error: OSError) -> None:
+        print(f"Помилка: {rel}: {error.strerror or error}", file=sys.stderr)
+
+    try:
+        stats = encrypt_directory(
+            args.src,
+            args.dst,
+            load_key(args.key_file),
+            workers=args.workers,
+            executor=args.executor,
+            header=not args.no_header,
+            prune=args.prune,
+            onerror=report,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Помилка: {e}", file=sys.stderr)
+        return 1
+    print(
+        f"Зашифровано: {stats['encrypted']}, без змін: {stats['skipped'] + stats['unchanged']}, "
+        f"видалено: {stats['removed']}, з помилками: {stats['failed']}"
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
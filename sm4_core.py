@@ -3,8 +3,24 @@
 
 from __future__ import annotations
 
-from typing import List
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import hashlib
+import hmac
+import os
 import secrets
+import struct
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необов'язковий: без нього працюють чисті Python-рушії
+    np = None
 
 # S-box, FK, CK - таблиці для SM4
 SBOX = [
@@ -69,6 +85,250 @@ def _T_key(x: int) -> int:
     return _L_key(_tau(x))
 
 
+def _build_t_tables() -> List[List[int]]:
+    """Побудова T-таблиць: S-блок і лінійне перетворення L злиті для кожного з 4 байтів слова."""
+    tables: List[List[int]] = []
+    for shift in (24, 16, 8, 0):
+        tables.append([_L_enc(SBOX[a] << shift) for a in range(256)])
+    return tables
+
+
+# T-таблиці: _T_enc(x) == T0[x >> 24] ^ T1[(x >> 16) & 0xFF] ^ T2[(x >> 8) & 0xFF] ^ T3[x & 0xFF]
+_T0, _T1, _T2, _T3 = _build_t_tables()
+
+# Парні 16-бітні таблиці (по 65536 записів) будуються лише при першому використанні
+_T16: Tuple[List[int], List[int]] | None = None
+
+
+def _t16_tables() -> Tuple[List[int], List[int]]:
+    """Лінива побудова 16-бітних таблиць: старша та молодша половини слова з S-блоком і L."""
+    global _T16
+    if _T16 is None:
+        hi = [a ^ b for a in _T0 for b in _T1]
+        lo = [a ^ b for a in _T2 for b in _T3]
+        _T16 = (hi, lo)
+    return _T16
+
+
+def _rounds_reference(x0: int, x1: int, x2: int, x3: int, round_keys: List[int]) -> Tuple[int, int, int, int]:
+    """32 раунди SM4 через еталонну функцію _T_enc. Повертає слова у вихідному порядку."""
+    for rk in round_keys:
+        x0, x1, x2, x3 = x1, x2, x3, x0 ^ _T_enc(x1 ^ x2 ^ x3 ^ rk)
+    return x3, x2, x1, x0
+
+
+def _rounds_ttable(x0: int, x1: int, x2: int, x3: int, round_keys: List[int]) -> Tuple[int, int, int, int]:
+    """32 раунди SM4 на T-таблицях: чотири звертання до таблиць і XOR без вкладених викликів."""
+    T0, T1, T2, T3 = _T0, _T1, _T2, _T3
+    for rk in round_keys:
+        t = x1 ^ x2 ^ x3 ^ rk
+        x0, x1, x2, x3 = x1, x2, x3, (
+            x0 ^ T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+        )
+    return x3, x2, x1, x0
+
+
+def _rounds_table16(x0: int, x1: int, x2: int, x3: int, round_keys: List[int]) -> Tuple[int, int, int, int]:
+    """32 раунди SM4 на парних 16-бітних таблицях: два звертання до таблиць на раунд.
+
+    Менше операцій на раунд не означає помітного прискорення в CPython (див. _ROUND_ENGINES):
+    для швидкості варто обирати "numpy", "bitslice" або "unrolled".
+    """
+    hi, lo = _t16_tables()
+    for rk in round_keys:
+        t = x1 ^ x2 ^ x3 ^ rk
+        x0, x1, x2, x3 = x1, x2, x3, x0 ^ hi[t >> 16] ^ lo[t & 0xFFFF]
+    return x3, x2, x1, x0
+
+
+# Векторизований рушій: блоки обробляються порціями, щоб проміжні масиви не займали забагато пам'яті
+_NUMPY_MIN_BLOCKS = 64
+_NUMPY_CHUNK_BLOCKS = 1 << 16
+_NP_T: Tuple["np.ndarray", ...] | None = None
+
+
+def _np_t_tables() -> Tuple["np.ndarray", ...]:
+    global _NP_T
+    if _NP_T is None:
+        _NP_T = tuple(np.array(t, dtype=np.uint32) for t in (_T0, _T1, _T2, _T3))
+    return _NP_T
+
+
+def _crypt_blocks_numpy(src: memoryview, dst: memoryview, round_keys: List[int]) -> None:
+    """Усі 32 раунди одночасно для всіх блоків буфера: слова як масив (N, 4) uint32, T-таблиці через take()."""
+    T0, T1, T2, T3 = _np_t_tables()
+    rks = [np.uint32(rk) for rk in round_keys]
+    words = np.frombuffer(src, dtype=">u4").reshape(-1, 4)
+    out = np.frombuffer(dst, dtype=">u4").reshape(-1, 4)
+    for start in range(0, len(words), _NUMPY_CHUNK_BLOCKS):
+        chunk = words[start:start + _NUMPY_CHUNK_BLOCKS].astype(np.uint32)
+        x0, x1, x2, x3 = (chunk[:, i].copy() for i in range(4))
+        for rk in rks:
+            t = x1 ^ x2
+            t ^= x3
+            t ^= rk
+            x0 ^= T0.take(t >> 24)
+            x0 ^= T1.take((t >> 16) & 0xFF)
+            x0 ^= T2.take((t >> 8) & 0xFF)
+            x0 ^= T3.take(t & 0xFF)
+            x0, x1, x2, x3 = x1, x2, x3, x0
+        target = out[start:start + _NUMPY_CHUNK_BLOCKS]
+        target[:, 0] = x3
+        target[:, 1] = x2
+        target[:, 2] = x1
+        target[:, 3] = x0
+
+
+# Бітслайсинг: кожен із 128 бітів блоку зберігається як окреме довге ціле (бітова площина),
+# у якому біт j належить j-му блоку пакета. Одна побітова операція обробляє весь пакет,
+# S-блок обчислюється як булева схема (алгебраїчна нормальна форма), без звертань до таблиць за даними,
+# тож послідовність операцій не залежить від значень блоків. Окремі блоки (encrypt_block) цей рушій
+# обробляє T-таблицями; останній блок із доповненням у encrypt_into/decrypt_into іде через схему.
+_BITSLICE_BATCH_BLOCKS = 16384
+_BS_SBOX = None
+
+# Трансляційні таблиці для транспонування: байт -> ASCII "0"/"1" для k-го біта (від старшого)
+_BS_BIT_TO_ASCII = [bytes(0x31 if (v >> (7 - k)) & 1 else 0x30 for v in range(256)) for k in range(8)]
+_BS_ASCII_TO_BIT = bytes(1 if v == 0x31 else 0 for v in range(256))
+
+
+def _sbox_anf() -> List[List[int]]:
+    """Коефіцієнти АНФ для кожного вихідного біта S-блоку (від старшого): список одночленів-масок."""
+    result = []
+    for k in range(8):
+        a = [(SBOX[x] >> (7 - k)) & 1 for x in range(256)]
+        for i in range(8):
+            bit = 1 << i
+            for x in range(256):
+                if x & bit:
+                    a[x] ^= a[x ^ bit]
+        result.append([m for m in range(256) if a[m]])
+    return result
+
+
+def _bs_sbox_fn():
+    """Лінива генерація булевої схеми S-блоку у вигляді лінійного коду без циклів."""
+    global _BS_SBOX
+    if _BS_SBOX is None:
+        anf = _sbox_anf()
+        used = sorted({m for monos in anf for m in monos if m & (m - 1)})
+        lines = ["def _bs_sbox(p0, p1, p2, p3, p4, p5, p6, p7, ones):"]
+        # Одночлен m — добуток змінних для встановлених бітів маски (біт 7 маски — старший біт байта)
+        names = {1 << (7 - i): f"p{i}" for i in range(8)}
+        for m in used:
+            low = m & -m
+            rest = m ^ low
+            if rest not in names:
+                raise AssertionError("одночлени мають оброблятися за зростанням")
+            names[m] = f"m{m}"
+            lines.append(f"    m{m} = {names[rest]} & {names[low]}")
+        outs = []
+        for k, monos in enumerate(anf):
+            terms = [names[m] if m else "ones" for m in monos]
+            lines.append(f"    y{k} = " + " ^ ".join(terms))
+            outs.append(f"y{k}")
+        lines.append("    return " + ", ".join(outs))
+        namespace: dict = {}
+        exec(compile("\n".join(lines), "<sm4-bitslice-sbox>", "exec"), namespace)
+        _BS_SBOX = namespace["_bs_sbox"]
+    return _BS_SBOX
+
+
+def _bs_to_planes(data: bytes, n: int) -> List[List[int]]:
+    """Транспонування n блоків у 4 слова по 32 бітові площини (індекс 0 — старший біт слова)."""
+    words: List[List[int]] = [[], [], [], []]
+    for b in range(16):
+        col = data[b::16]
+        planes = words[b // 4]
+        for k in range(8):
+            planes.append(int(col.translate(_BS_BIT_TO_ASCII[k]), 2))
+    return words
+
+
+def _bs_from_planes(words: List[List[int]], n: int) -> bytes:
+    """Зворотне транспонування бітових площин у n блоків по 16 байтів."""
+    out = bytearray(16 * n)
+    fmt = f"0{n}b"
+    for b in range(16):
+        planes = words[b // 4]
+        acc = 0
+        for k in range(8):
+            bits = format(planes[8 * (b % 4) + k], fmt).encode("ascii").translate(_BS_ASCII_TO_BIT)
+            acc |= int.from_bytes(bits, "big") << (7 - k)
+        out[b::16] = acc.to_bytes(n, "big")
+    return bytes(out)
+
+
+def _bs_rounds(x0: List[int], x1: List[int], x2: List[int], x3: List[int],
+               rk_planes: List[List[int]], ones: int) -> List[List[int]]:
+    """32 раунди SM4 над бітовими площинами; ключі раундів теж задаються площинами."""
+    sbox = _bs_sbox_fn()
+    for rkp in rk_planes:
+        t = [a ^ b ^ c ^ k for a, b, c, k in zip(x1, x2, x3, rkp)]
+        s = [*sbox(*t[0:8], ones), *sbox(*t[8:16], ones), *sbox(*t[16:24], ones), *sbox(*t[24:32], ones)]
+        # L(B) = B ^ (B <<< 2) ^ (B <<< 10) ^ (B <<< 18) ^ (B <<< 24): зсув — лише перенумерація площин
+        y = [
+            x0[i] ^ s[i] ^ s[(i + 2) & 31] ^ s[(i + 10) & 31] ^ s[(i + 18) & 31] ^ s[(i + 24) & 31]
+            for i in range(32)
+        ]
+        x0, x1, x2, x3 = x1, x2, x3, y
+    return [x3, x2, x1, x0]
+
+
+def _crypt_blocks_bitslice(src: memoryview, dst: memoryview, round_keys: List[int]) -> None:
+    """Бітслайсингова обробка буфера пакетами по _BITSLICE_BATCH_BLOCKS блоків."""
+    step = _BITSLICE_BATCH_BLOCKS * 16
+    for start in range(0, len(src), step):
+        chunk = bytes(src[start:start + step])
+        n = len(chunk) // 16
+        ones = (1 << n) - 1
+        rk_planes = [[ones if (rk >> (31 - i)) & 1 else 0 for i in range(32)] for rk in round_keys]
+        x0, x1, x2, x3 = _bs_to_planes(chunk, n)
+        dst[start:start + len(chunk)] = _bs_from_planes(_bs_rounds(x0, x1, x2, x3, rk_planes, ones), n)
+
+
+def _compile_unrolled(round_keys: List[int]) -> Callable[[int, int, int, int], Tuple[int, int, int, int]]:
+    """Генерація функції з 32 розгорнутими раундами T-таблиць і ключами раундів як константами."""
+    lines = ["def _sm4_unrolled(x0, x1, x2, x3, T0=T0, T1=T1, T2=T2, T3=T3):"]
+    for i, rk in enumerate(round_keys):
+        # Раунд i оновлює слово x(i mod 4) замість додавання нового елемента до списку
+        a, b, c, d = (f"x{(i + j) % 4}" for j in range(4))
+        lines.append(f"    t = {b} ^ {c} ^ {d} ^ 0x{rk:08X}")
+        lines.append(f"    {a} ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]")
+    lines.append("    return x3, x2, x1, x0")
+    namespace = {"T0": _T0, "T1": _T1, "T2": _T2, "T3": _T3}
+    exec(compile("\n".join(lines), "<sm4-unrolled>", "exec"), namespace)
+    return namespace["_sm4_unrolled"]
+
+
+_BLOCK = struct.Struct(">4I")
+
+# Рушії раундової функції: "reference" — еталонна реалізація, "ttable" — швидка на T-таблицях,
+# "table16" — два звертання до таблиць на раунд замість чотирьох ціною ~5 МБ пам'яті під таблиці;
+#   у CPython час раунду визначає інтерпретатор, тож виграш проти "ttable" у межах шуму вимірювань
+#   (0–20 % залежно від машини), а на деяких системах його немає зовсім,
+# "numpy" — T-таблиці для окремих блоків і векторизована обробка цілих буферів,
+# "bitslice" — бітслайсингова обробка буферів без сторонніх залежностей,
+# "unrolled" — функція, згенерована для конкретного ключа (найменша затримка на малих повідомленнях)
+_ROUND_ENGINES = {
+    "reference": _rounds_reference,
+    "ttable": _rounds_ttable,
+    "table16": _rounds_table16,
+    "numpy": _rounds_ttable,
+    "bitslice": _rounds_ttable,
+    "unrolled": _rounds_ttable,
+}
+
+# Рушії, що обробляють одразу весь буфер з багатьох блоків: (функція, мінімальна кількість блоків)
+_BULK_ENGINES = {
+    "numpy": (_crypt_blocks_numpy, _NUMPY_MIN_BLOCKS),
+    "bitslice": (_crypt_blocks_bitslice, 1),
+}
+
+ENGINES = tuple(_ROUND_ENGINES)
+DEFAULT_ENGINE = "numpy" if np is not None else "ttable"
+
+
 def _bytes_to_words(block: bytes) -> List[int]:
     if len(block) != 16:
         raise ValueError(
@@ -86,17 +346,148 @@ def _words_to_bytes(words: List[int]) -> bytes:
     return b"".join(w.to_bytes(4, "big") for w in words)
 
 
+class KeyScheduleCache:
+    """Обмежений LRU-кеш розгорнутих ключів раундів SM4.
+
+    Записи індексуються HMAC-SHA256 від ключа з випадковим секретом процесу, сам ключ не зберігається.
+    Разом із записом зберігаються скомпільовані рушієм "unrolled" функції, щоб їх не компілювати
+    заново для кожного нового екземпляра SM4 з тим самим ключем.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        if maxsize < 1:
+            raise ValueError("Розмір кешу ключів повинен бути не меншим за 1.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._secret = secrets.token_bytes(32)
+        self._entries: "OrderedDict[bytes, List[int]]" = OrderedDict()
+        self._compiled: Dict[bytes, Dict[str, Callable]] = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, key: bytes) -> bytes:
+        return hmac.new(self._secret, key, hashlib.sha256).digest()
+
+    def get(self, key: bytes, schedule: Callable[[bytes], List[int]]) -> List[int]:
+        """Повертає копію ключів раундів для ключа; за відсутності обчислює їх через schedule."""
+        digest = self._digest(key)
+        with self._lock:
+            rk = self._entries.get(digest)
+            if rk is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return list(rk)
+            self.misses += 1
+        rk = schedule(key)
+        with self._lock:
+            self._entries[digest] = list(rk)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                old_digest, old = self._entries.popitem(last=False)
+                self._compiled.pop(old_digest, None)
+                self._wipe(old)
+        return rk
+
+    def peek_compiled(self, digest: bytes, direction: str) -> Optional[Callable]:
+        """Скомпільована функція для запису digest і напрямку або None, якщо її ще не побудовано."""
+        with self._lock:
+            return self._compiled.get(digest, {}).get(direction)
+
+    def compiled(self, digest: bytes, direction: str, build: Callable[[], Callable]) -> Callable:
+        """Скомпільована функція для запису digest і напрямку ("enc"/"dec"); за відсутності будується через build.
+
+        Функція зберігається, лише поки в кеші є відповідний запис ключів раундів.
+        """
+        fn = self.peek_compiled(digest, direction)
+        if fn is not None:
+            return fn
+        fn = build()
+        with self._lock:
+            if digest in self._entries:
+                self._compiled.setdefault(digest, {})[direction] = fn
+        return fn
+
+    @staticmethod
+    def _wipe(rk: List[int]) -> None:
+        # Цілі числа Python незмінні, тому затираються посилання у списку, а не самі значення в пам'яті
+        for i in range(len(rk)):
+            rk[i] = 0
+
+    def evict(self, key: bytes) -> bool:
+        """Видалення й затирання запису для ключа. Повертає True, якщо запис був у кеші."""
+        digest = self._digest(key)
+        with self._lock:
+            rk = self._entries.pop(digest, None)
+            self._compiled.pop(digest, None)
+        if rk is None:
+            return False
+        self._wipe(rk)
+        return True
+
+    def clear(self) -> None:
+        """Затирання й видалення всіх записів кешу."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._compiled.clear()
+        for rk in entries:
+            self._wipe(rk)
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика кешу: влучання, промахи, поточний і максимальний розмір."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# Спільний кеш ключів для модульних функцій і графічного інтерфейсу
+key_schedule_cache = KeyScheduleCache()
+
+
 class SM4:
     """Реалізація блочного шифру SM4 (SMS4)."""
 
-    def __init__(self, key: bytes) -> None:
+    def __init__(
+        self,
+        key: bytes,
+        engine: str = "reference",
+        cache: Optional[KeyScheduleCache] = None,
+    ) -> None:
+        if engine not in _ROUND_ENGINES:
+            raise ValueError(
+                f"Невідомий рушій SM4: {engine!r}.\n"
+                f"Доступні рушії: {', '.join(ENGINES)}."
+            )
         if len(key) != 16:
             raise ValueError(
                 "Ключ SM4 повинен бути довжиною рівно 16 байтів (128 біт).\n"
                 "Перевірте, що ключ містить 32 HEX-символи без пробілів."
             )
-        self._rk_enc = self._key_schedule(key)
+        if cache is not None:
+            self._rk_enc = cache.get(bytes(key), self._key_schedule)
+        else:
+            self._rk_enc = self._key_schedule(key)
         self._rk_dec = list(reversed(self._rk_enc))
+        if engine == "numpy" and np is None:
+            engine = "ttable"
+        self.engine = engine
+        self._rounds = _ROUND_ENGINES[engine]
+        self._bulk_fn, self._bulk_min_blocks = _BULK_ENGINES.get(engine, (None, 0))
+        # Скомпільовані розгорнуті функції кешуються на екземплярі (окремо для шифрування і розшифрування),
+        # а за наявності cache — ще й у записі кешу ключів, спільному для всіх екземплярів із цим ключем
+        self._unrolled: Dict[int, Callable[[int, int, int, int], Tuple[int, int, int, int]]] = {}
+        self._cache = cache if engine == "unrolled" else None
+        self._cache_digest = cache._digest(bytes(key)) if self._cache is not None else None
+        if engine == "reference":
+            self._block_fn = self._crypt_block
+        elif engine == "unrolled":
+            self._block_fn = self._crypt_block_unrolled
+        else:
+            self._block_fn = self._crypt_block_fast
 
     def _key_schedule(self, key: bytes) -> List[int]:
         MK = _bytes_to_words(key)
@@ -116,13 +507,203 @@ class SM4:
         Y = [X[35], X[34], X[33], X[32]]
         return _words_to_bytes(Y)
 
+    def _crypt_block_fast(self, block: bytes, round_keys: List[int]) -> bytes:
+        x0, x1, x2, x3 = _bytes_to_words(block)
+        return _words_to_bytes(list(self._rounds(x0, x1, x2, x3, round_keys)))
+
+    def _words_fn(self, round_keys: List[int]) -> Callable[[int, int, int, int], Tuple[int, int, int, int]]:
+        """Функція 32 раундів над чотирма словами для заданого напрямку (ключів раундів)."""
+        if self.engine != "unrolled":
+            return partial(self._rounds, round_keys=round_keys)
+        fn = self._unrolled.get(id(round_keys))
+        if fn is None:
+            build = partial(_compile_unrolled, round_keys)
+            if self._cache is not None and (round_keys is self._rk_enc or round_keys is self._rk_dec):
+                direction = "enc" if round_keys is self._rk_enc else "dec"
+                fn = self._cache.compiled(self._cache_digest, direction, build)
+            else:
+                fn = build()
+            self._unrolled[id(round_keys)] = fn
+        return fn
+
+    def _crypt_block_unrolled(self, block: bytes, round_keys: List[int]) -> bytes:
+        if len(block) != 16:
+            raise ValueError(
+                "Внутрішня помилка: блок SM4 повинен містити рівно 16 байтів.\n"
+                "Якщо ви бачите це повідомлення, зверніться до розробника."
+            )
+        return _BLOCK.pack(*self._words_fn(round_keys)(*_BLOCK.unpack(block)))
+
     def encrypt_block(self, block: bytes) -> bytes:
         """Шифрування одного блоку (16 байтів)."""
-        return self._crypt_block(block, self._rk_enc)
+        return self._block_fn(block, self._rk_enc)
 
     def decrypt_block(self, block: bytes) -> bytes:
         """Розшифрування одного блоку (16 байтів)."""
-        return self._crypt_block(block, self._rk_dec)
+        return self._block_fn(block, self._rk_dec)
+
+    def _crypt_into(self, src: memoryview, dst: memoryview, round_keys: List[int]) -> None:
+        """Обробка цілих блоків src із записом у dst (dst може збігатися з src)."""
+        if self._bulk_fn is not None and len(src) >= self._bulk_min_blocks * 16:
+            self._bulk_fn(src, dst, round_keys)
+            return
+        if self.engine == "reference":
+            for i in range(0, len(src), 16):
+                dst[i:i + 16] = self._crypt_block(bytes(src[i:i + 16]), round_keys)
+            return
+        # Один прохід по буферу: слова розпаковуються без зрізів, результат пакується у готовий буфер
+        words = self._words_fn(round_keys)
+        pack_into = _BLOCK.pack_into
+        offset = 0
+        for block in _BLOCK.iter_unpack(src):
+            pack_into(dst, offset, *words(*block))
+            offset += 16
+
+    def _crypt_blocks(self, data: bytes, round_keys: List[int]) -> bytes:
+        if len(data) % 16 != 0:
+            raise ValueError(
+                "Довжина даних повинна бути кратною 16 байтам (розмір блоку SM4).\n"
+                "Для даних довільної довжини використовуйте PKCS#7-доповнення."
+            )
+        out = bytearray(len(data))
+        self._crypt_into(memoryview(data).cast("B"), memoryview(out), round_keys)
+        return bytes(out)
+
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Шифрування послідовності блоків без доповнення (довжина кратна 16 байтам)."""
+        return self._crypt_blocks(data, self._rk_enc)
+
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Розшифрування послідовності блоків без зняття доповнення (довжина кратна 16 байтам)."""
+        return self._crypt_blocks(data, self._rk_dec)
+
+    @staticmethod
+    def _buffers(src, dst) -> Tuple[memoryview, memoryview]:
+        src_view = memoryview(src).cast("B")
+        dst_view = memoryview(dst).cast("B")
+        if dst_view.readonly:
+            raise ValueError(
+                "Буфер для результату доступний лише для читання.\n"
+                "Передайте bytearray, memoryview, mmap або масив NumPy з правом запису."
+            )
+        return src_view, dst_view
+
+    @staticmethod
+    def _check_capacity(dst: memoryview, needed: int) -> None:
+        if len(dst) < needed:
+            raise ValueError(
+                f"Буфер для результату замалий: потрібно {needed} байтів, доступно {len(dst)}."
+            )
+
+    def encrypt_into(self, src, dst, padding: bool = True) -> int:
+        """Шифрування ECB з будь-якого буфера у наданий буфер dst (можна «на місці»).
+
+        Доповнення PKCS#7 формується лише для останнього блоку, тому dst повинен мати місце
+        для len(src), округленої вгору до наступних 16 байтів. Повертає кількість записаних байтів.
+        """
+        src, dst = self._buffers(src, dst)
+        full = len(src) - len(src) % 16
+        if padding:
+            # Хвіст читаємо до основної обробки: при шифруванні «на місці» його перекриє результат
+            last = pkcs7_pad(bytes(src[full:]), 16)
+            needed = full + 16
+        else:
+            if full != len(src):
+                raise ValueError(
+                    "Без доповнення довжина даних повинна бути кратною 16 байтам."
+                )
+            needed = full
+        self._check_capacity(dst, needed)
+        self._crypt_into(src[:full], dst[:full], self._rk_enc)
+        if padding:
+            # Через _crypt_into, а не encrypt_block: для "bitslice" хвіст теж не йде через T-таблиці
+            self._crypt_into(memoryview(last), dst[full:needed], self._rk_enc)
+        return needed
+
+    def decrypt_into(self, src, dst, padding: bool = True) -> int:
+        """Розшифрування ECB з будь-якого буфера у наданий буфер dst (можна «на місці»).
+
+        Спочатку розшифровується й перевіряється лише останній блок із доповненням.
+        Повертає довжину відкритого тексту, записаного на початок dst.
+        """
+        src, dst = self._buffers(src, dst)
+        if len(src) % 16 != 0 or (padding and not src):
+            raise ValueError(
+                "Довжина шифртексту повинна бути кратною 16 байтам (розмір блоку SM4).\n"
+                "Переконайтеся, що файл не був обрізаний або пошкоджений."
+            )
+        if not padding:
+            self._check_capacity(dst, len(src))
+            self._crypt_into(src, dst, self._rk_dec)
+            return len(src)
+        full = len(src) - 16
+        last = bytearray(16)
+        self._crypt_into(src[full:], memoryview(last), self._rk_dec)
+        tail = pkcs7_unpad(bytes(last), 16)
+        needed = full + len(tail)
+        self._check_capacity(dst, needed)
+        self._crypt_into(src[:full], dst[:full], self._rk_dec)
+        dst[full:needed] = tail
+        return needed
+
+    def encrypt_many(self, messages: List[bytes]) -> List[bytes]:
+        """Шифрування ECB багатьох коротких повідомлень за один пакетний прохід рушія.
+
+        Кожне повідомлення доповнюється PKCS#7 окремо; результат — список шифртекстів у тому ж порядку.
+        """
+        parts = []
+        sizes = []
+        for message in messages:
+            pad_len = 16 - len(message) % 16
+            parts.append(bytes(message))
+            parts.append(bytes([pad_len]) * pad_len)
+            sizes.append(len(message) + pad_len)
+        ct = self.encrypt_blocks(b"".join(parts))
+        out = []
+        offset = 0
+        for size in sizes:
+            out.append(ct[offset:offset + size])
+            offset += size
+        return out
+
+    def decrypt_many(self, ciphertexts: List[bytes]) -> List[Union[bytes, ValueError]]:
+        """Розшифрування ECB багатьох повідомлень за один пакетний прохід рушія.
+
+        Помилки не перериваються на першому збої: для повідомлення з некоректною довжиною чи
+        доповненням на його місці у списку повертається ValueError, для решти — відкритий текст.
+        """
+        results: List[Union[bytes, ValueError]] = []
+        valid = []
+        for ct in ciphertexts:
+            if not ct or len(ct) % 16 != 0:
+                results.append(ValueError(
+                    "Довжина шифртексту повинна бути кратною 16 байтам (розмір блоку SM4).\n"
+                    "Переконайтеся, що повідомлення не було обрізане або пошкоджене."
+                ))
+            else:
+                results.append(b"")
+                valid.append(bytes(ct))
+        plain = self.decrypt_blocks(b"".join(valid))
+        offset = 0
+        for index, ct in enumerate(ciphertexts):
+            if isinstance(results[index], ValueError):
+                continue
+            block = plain[offset:offset + len(ct)]
+            offset += len(ct)
+            try:
+                results[index] = pkcs7_unpad(block, 16)
+            except ValueError as exc:
+                results[index] = exc
+        return results
+
+
+def get_cipher(key: bytes, engine: str = DEFAULT_ENGINE) -> SM4:
+    """Створення SM4 з розгорнутими ключами зі спільного кешу key_schedule_cache."""
+    return SM4(key, engine, cache=key_schedule_cache)
+
+
+class WrongKeyError(ValueError):
+    """Некоректне PKCS#7-доповнення після розшифрування — ймовірно, неправильний ключ або пошкоджені дані."""
 
 
 def pkcs7_pad(data: bytes, block_size: int = 16) -> bytes:
@@ -142,16 +723,16 @@ def pkcs7_unpad(data: bytes, block_size: int = 16) -> bytes:
         )
     pad_len = data[-1]
     if pad_len < 1 or pad_len > block_size:
-        raise ValueError(
-            "Не вдалося зняти PKCS#7-доповнення.\n"
+        raise WrongKeyError(
+            "Не вдалося зняти PKCS#7-доповнення — ймовірно, неправильний ключ.\n"
             "Можливі причини:\n"
             " • використано неправильний ключ;\n"
             " • шифртекст пошкоджений або змінений;\n"
             " • дані були зашифровані іншим алгоритмом чи режимом."
         )
     if data[-pad_len:] != bytes([pad_len]) * pad_len:
-        raise ValueError(
-            "Не вдалося зняти PKCS#7-доповнення.\n"
+        raise WrongKeyError(
+            "Не вдалося зняти PKCS#7-доповнення — ймовірно, неправильний ключ.\n"
             "Можливі причини:\n"
             " • використано неправильний ключ;\n"
             " • шифртекст пошкоджений або змінений;\n"
@@ -160,28 +741,1197 @@ def pkcs7_unpad(data: bytes, block_size: int = 16) -> bytes:
     return data[:-pad_len]
 
 
-def sm4_encrypt_ecb(data: bytes, key: bytes) -> bytes:
-    """Шифрування довільних даних у режимі ECB з PKCS#7-доповненням."""
-    cipher = SM4(key)
+class ECBBlockMemo:
+    """Обмежений кеш для одного ключа ECB: блок відкритого тексту ↔ блок шифртексту.
+
+    Корисний для даних із великою кількістю однакових блоків (нульові образи, заповнювачі, записи
+    фіксованого формату). Дані обробляються вікнами по sample_blocks блоків; якщо частка влучань
+    у вікні нижча за min_hit_rate, кеш обходиться (звичайний пакетний рушій) і періодично
+    перевіряється знову.
+    """
+
+    _secret = secrets.token_bytes(32)
+
+    def __init__(
+        self,
+        key: bytes,
+        max_entries: int = 1 << 16,
+        sample_blocks: int = 4096,
+        min_hit_rate: float = 0.1,
+    ) -> None:
+        if max_entries < 1 or sample_blocks < 1:
+            raise ValueError("Розмір кешу блоків і вікна вибірки повинні бути більшими за 0.")
+        self.max_entries = max_entries
+        self.sample_blocks = sample_blocks
+        self.min_hit_rate = min_hit_rate
+        self._key_tag = hmac.new(self._secret, bytes(key), hashlib.sha256).digest()
+        self._enc: Dict[bytes, bytes] = {}
+        self._dec: Dict[bytes, bytes] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._bypass_left = 0
+
+    def check_key(self, key: bytes) -> None:
+        if not hmac.compare_digest(self._key_tag, hmac.new(self._secret, bytes(key), hashlib.sha256).digest()):
+            raise ValueError("Кеш блоків ECB створено для іншого ключа.")
+
+    def _remember(self, table: Dict[bytes, bytes], src: bytes, dst: bytes) -> None:
+        if len(table) >= self.max_entries:
+            # Витіснення найстарішого запису (словник зберігає порядок вставлення)
+            del table[next(iter(table))]
+        table[src] = dst
+
+    def _window(self, cipher: SM4, data: bytes, decrypt: bool) -> bytes:
+        table, inverse = (self._dec, self._enc) if decrypt else (self._enc, self._dec)
+        blocks = [data[i:i + 16] for i in range(0, len(data), 16)]
+        # Відповіді фіксуються до вставлення нових записів, які можуть витіснити старі
+        lookup = {}
+        missing = []
+        for block in dict.fromkeys(blocks):
+            result = table.get(block)
+            if result is None:
+                missing.append(block)
+            else:
+                lookup[block] = result
+        if missing:
+            joined = b"".join(missing)
+            done = cipher.decrypt_blocks(joined) if decrypt else cipher.encrypt_blocks(joined)
+            for i, block in enumerate(missing):
+                result = done[16 * i:16 * i + 16]
+                lookup[block] = result
+                self._remember(table, block, result)
+                self._remember(inverse, result, block)
+        hits = len(blocks) - len(missing)
+        self.misses += len(missing)
+        self.hits += hits
+        if hits < self.min_hit_rate * len(blocks):
+            # Замало повторів: наступні 16 вікон обробляються в обхід кешу, потім — нова перевірка
+            self._bypass_left = 16 * self.sample_blocks
+        return b"".join([lookup[b] for b in blocks])
+
+    def crypt(self, cipher: SM4, data: bytes, decrypt: bool = False) -> bytes:
+        """Обробка цілих блоків data через кеш (або в обхід кешу, якщо влучань замало)."""
+        out = []
+        step = 16 * self.sample_blocks
+        for start in range(0, len(data), step):
+            window = bytes(data[start:start + step])
+            if self._bypass_left > 0:
+                self._bypass_left -= len(window) // 16
+                self.bypassed += len(window) // 16
+                out.append(cipher.decrypt_blocks(window) if decrypt else cipher.encrypt_blocks(window))
+            else:
+                out.append(self._window(cipher, window, decrypt))
+        return b"".join(out)
+
+    def stats(self) -> Dict[str, float]:
+        """Статистика: влучання, промахи, блоки в обхід кешу, частка влучань, кількість записів."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._enc),
+            "bypass_active": self._bypass_left > 0,
+        }
+
+
+def sm4_encrypt_ecb(
+    data: bytes,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    memo: Optional[ECBBlockMemo] = None,
+) -> bytes:
+    """Шифрування довільних даних у режимі ECB з PKCS#7-доповненням.
+
+    memo — необов'язковий кеш повторюваних блоків для цього ключа (див. ECBBlockMemo).
+    """
+    cipher = get_cipher(key, engine)
+    if memo is not None:
+        memo.check_key(key)
+        return memo.crypt(cipher, pkcs7_pad(bytes(data), 16))
+    out = bytearray(len(data) - len(data) % 16 + 16)
+    cipher.encrypt_into(data, out)
+    return bytes(out)
+
+
+def sm4_decrypt_ecb(
+    data: bytes,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    memo: Optional[ECBBlockMemo] = None,
+) -> bytes:
+    """Розшифрування даних у режимі ECB з видаленням PKCS#7-доповнення.
+
+    Останній блок розшифровується й перевіряється першим, тому неправильний ключ
+    (WrongKeyError) виявляється до обробки решти даних.
+    memo — необов'язковий кеш повторюваних блоків для цього ключа (див. ECBBlockMemo).
+    """
+    if not data or len(data) % 16 != 0:
+        raise ValueError(
+            "Довжина шифртексту повинна бути кратною 16 байтам (розмір блоку SM4).\n"
+            "Переконайтеся, що файл не був обрізаний або пошкоджений."
+        )
+    cipher = get_cipher(key, engine)
+    if memo is not None:
+        memo.check_key(key)
+        tail = sm4_decrypt_ecb_tail(data[-16:], key, engine)
+        return memo.crypt(cipher, data[:-16], decrypt=True) + tail
+    out = bytearray(len(data))
+    del out[cipher.decrypt_into(data, out):]
+    return bytes(out)
+
+
+def sm4_decrypt_ecb_tail(last_block: bytes, key: bytes, engine: str = DEFAULT_ENGINE) -> bytes:
+    """Розшифрування лише останнього блоку ECB-шифртексту з перевіркою PKCS#7.
+
+    Швидка перевірка ключа перед масовим розшифруванням: повертає відкритий текст останнього
+    блоку без доповнення або піднімає WrongKeyError, якщо доповнення некоректне.
+    """
+    if len(last_block) != 16:
+        raise ValueError("Останній блок шифртексту повинен мати довжину 16 байтів.")
+    return pkcs7_unpad(get_cipher(key, engine).decrypt_blocks(bytes(last_block)), 16)
+
+
+def _key_schedule_numpy(keys: bytes, m: int) -> "np.ndarray":
+    """Векторизований розклад ключів: масив (m, 32) ключів раундів для m ключів одночасно."""
+    sbox = np.array(SBOX, dtype=np.uint32)
+    mk = np.frombuffer(keys, dtype=">u4").reshape(m, 4).astype(np.uint32)
+    k0, k1, k2, k3 = (mk[:, i] ^ np.uint32(FK[i]) for i in range(4))
+    rk = np.empty((m, 32), dtype=np.uint32)
+    for i in range(32):
+        t = k1 ^ k2 ^ k3 ^ np.uint32(CK[i])
+        b = (
+            (sbox.take(t >> 24) << 24) | (sbox.take((t >> 16) & 0xFF) << 16)
+            | (sbox.take((t >> 8) & 0xFF) << 8) | sbox.take(t & 0xFF)
+        )
+        new = k0 ^ b ^ ((b << 13) | (b >> 19)) ^ ((b << 23) | (b >> 9))
+        rk[:, i] = new
+        k0, k1, k2, k3 = k1, k2, k3, new
+    return rk
+
+
+def _const_planes(value: int, ones: int) -> List[int]:
+    return [ones if (value >> (31 - i)) & 1 else 0 for i in range(32)]
+
+
+def _bs_key_schedule(mk: List[List[int]], ones: int) -> List[List[int]]:
+    """Бітслайсинговий розклад ключів: площини ключів раундів для всіх ключів пакета."""
+    sbox = _bs_sbox_fn()
+    k0, k1, k2, k3 = ([p ^ f for p, f in zip(mk[w], _const_planes(FK[w], ones))] for w in range(4))
+    rk_planes = []
+    for ck in CK:
+        t = [a ^ b ^ c ^ d for a, b, c, d in zip(k1, k2, k3, _const_planes(ck, ones))]
+        s = [*sbox(*t[0:8], ones), *sbox(*t[8:16], ones), *sbox(*t[16:24], ones), *sbox(*t[24:32], ones)]
+        new = [k0[i] ^ s[i] ^ s[(i + 13) & 31] ^ s[(i + 23) & 31] for i in range(32)]
+        rk_planes.append(new)
+        k0, k1, k2, k3 = k1, k2, k3, new
+    return rk_planes
+
+
+def _check_keys(keys: List[bytes]) -> bytes:
+    for index, key in enumerate(keys):
+        if len(key) != 16:
+            raise ValueError(
+                f"Ключ №{index} має довжину {len(key)} байтів.\n"
+                "Кожен ключ SM4 повинен бути довжиною рівно 16 байтів (128 біт)."
+            )
+    return b"".join(bytes(key) for key in keys)
+
+
+_RK_ROW = struct.Struct(">32I")
+
+
+def _schedule_table(keys: bytes, m: int) -> bytes:
+    """Ключі раундів усіх ключів: m рядків по 128 байтів (32 слова big-endian)."""
+    if not m:
+        return b""
+    if np is not None:
+        return _key_schedule_numpy(keys, m).astype(">u4").tobytes()
+    rows = [bytearray() for _ in range(m)]
+    step = _BITSLICE_BATCH_BLOCKS
+    for start in range(0, m, step):
+        n = min(step, m - start)
+        rk_planes = _bs_key_schedule(_bs_to_planes(keys[16 * start:16 * (start + n)], n), (1 << n) - 1)
+        for q in range(8):
+            group = _bs_from_planes(rk_planes[4 * q:4 * q + 4], n)
+            for j in range(n):
+                rows[start + j] += group[16 * j:16 * j + 16]
+    return b"".join(rows)
+
+
+def sm4_key_schedule_many(keys: List[bytes]) -> List[List[int]]:
+    """Розклад багатьох ключів одним векторизованим проходом (NumPy або бітслайсинг)."""
+    table = _schedule_table(_check_keys(keys), len(keys))
+    return [list(_RK_ROW.unpack_from(table, 128 * i)) for i in range(len(keys))]
+
+
+class MultiKeySM4:
+    """Пакетне шифрування блоків під тисячами ключів за один векторизований прохід.
+
+    Ключі розгортаються разом під час створення; для кожного блоку задається номер ключа
+    (key_ids[i] — індекс у списку keys), і ключі раундів збираються окремо для кожної «смуги».
+    З NumPy використовується векторизований рушій, без нього — бітслайсинг.
+    """
+
+    def __init__(self, keys: List[bytes]) -> None:
+        self.key_count = len(keys)
+        table = _schedule_table(_check_keys(keys), len(keys))
+        if np is not None:
+            self._rk = np.frombuffer(table, dtype=">u4").reshape(-1, 32).astype(np.uint32)
+        else:
+            self._rows = [table[128 * i:128 * i + 128] for i in range(len(keys))]
+
+    def _check_ids(self, key_ids: List[int], blocks: bytes) -> None:
+        if len(blocks) != 16 * len(key_ids):
+            raise ValueError(
+                "Кількість блоків повинна збігатися з кількістю номерів ключів "
+                "(по 16 байтів на кожен номер)."
+            )
+        for key_id in key_ids:
+            if not 0 <= key_id < self.key_count:
+                raise ValueError(f"Номер ключа {key_id} поза межами списку з {self.key_count} ключів.")
+
+    def _crypt_numpy(self, key_ids: List[int], blocks: bytes, decrypt: bool) -> bytes:
+        T0, T1, T2, T3 = _np_t_tables()
+        ids = np.asarray(key_ids, dtype=np.intp)
+        words = np.frombuffer(blocks, dtype=">u4").reshape(-1, 4)
+        out = np.empty(words.shape, dtype=">u4")
+        order = range(31, -1, -1) if decrypt else range(32)
+        for start in range(0, len(words), _NUMPY_CHUNK_BLOCKS):
+            chunk = words[start:start + _NUMPY_CHUNK_BLOCKS].astype(np.uint32)
+            lane_rk = self._rk[ids[start:start + _NUMPY_CHUNK_BLOCKS]]
+            x0, x1, x2, x3 = (chunk[:, i].copy() for i in range(4))
+            for r in order:
+                t = x1 ^ x2
+                t ^= x3
+                t ^= lane_rk[:, r]
+                x0 ^= T0.take(t >> 24)
+                x0 ^= T1.take((t >> 16) & 0xFF)
+                x0 ^= T2.take((t >> 8) & 0xFF)
+                x0 ^= T3.take(t & 0xFF)
+                x0, x1, x2, x3 = x1, x2, x3, x0
+            target = out[start:start + _NUMPY_CHUNK_BLOCKS]
+            target[:, 0] = x3
+            target[:, 1] = x2
+            target[:, 2] = x1
+            target[:, 3] = x0
+        return out.tobytes()
+
+    def _crypt_bitslice(self, key_ids: List[int], blocks: bytes, decrypt: bool) -> bytes:
+        out = bytearray()
+        step = _BITSLICE_BATCH_BLOCKS
+        for start in range(0, len(key_ids), step):
+            ids = key_ids[start:start + step]
+            n = len(ids)
+            ones = (1 << n) - 1
+            rows = [self._rows[key_id] for key_id in ids]
+            rk_planes: List[List[int]] = []
+            for q in range(8):
+                rk_planes.extend(_bs_to_planes(b"".join(row[16 * q:16 * q + 16] for row in rows), n))
+            if decrypt:
+                rk_planes.reverse()
+            x0, x1, x2, x3 = _bs_to_planes(blocks[16 * start:16 * (start + n)], n)
+            out += _bs_from_planes(_bs_rounds(x0, x1, x2, x3, rk_planes, ones), n)
+        return bytes(out)
+
+    def _crypt(self, key_ids: List[int], blocks: bytes, decrypt: bool) -> bytes:
+        key_ids = list(key_ids)
+        blocks = bytes(blocks)
+        self._check_ids(key_ids, blocks)
+        if not key_ids:
+            return b""
+        if np is not None:
+            return self._crypt_numpy(key_ids, blocks, decrypt)
+        return self._crypt_bitslice(key_ids, blocks, decrypt)
+
+    def encrypt_blocks(self, key_ids: List[int], blocks: bytes) -> bytes:
+        """Шифрування блоків: i-й блок — ключем keys[key_ids[i]]."""
+        return self._crypt(key_ids, blocks, False)
+
+    def decrypt_blocks(self, key_ids: List[int], blocks: bytes) -> bytes:
+        """Розшифрування блоків: i-й блок — ключем keys[key_ids[i]]."""
+        return self._crypt(key_ids, blocks, True)
+
+
+def sm4_encrypt_many(messages: List[bytes], key: bytes, engine: str = DEFAULT_ENGINE) -> List[bytes]:
+    """Шифрування ECB з PKCS#7 багатьох повідомлень одним ключем за один пакетний прохід."""
+    return get_cipher(key, engine).encrypt_many(messages)
+
+
+def sm4_decrypt_many(
+    ciphertexts: List[bytes],
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+) -> List[Union[bytes, ValueError]]:
+    """Розшифрування багатьох повідомлень; помилки доповнення повертаються окремо для кожного."""
+    return get_cipher(key, engine).decrypt_many(ciphertexts)
+
+
+# Паралельний ECB: буфер ділиться на частини, кратні блоку, і обробляється пулом потоків або процесів
+PARALLEL_CHUNK_SIZE = 4 << 20
+EXECUTORS = ("auto", "thread", "process")
+
+# Рушії, що відпускають GIL на час обчислень над великими масивами
+_GIL_RELEASING_ENGINES = {"numpy"}
+
+
+def _gil_disabled() -> bool:
+    """Чи працює інтерпретатор без GIL (free-threaded збірка CPython 3.13t+)."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _resolve_executor(executor: str, engine: str) -> str:
+    if executor not in EXECUTORS:
+        raise ValueError(
+            f"Невідомий виконавець: {executor!r}.\n"
+            f"Доступні виконавці: {', '.join(EXECUTORS)}."
+        )
+    if executor != "auto":
+        return executor
+    # Потоки не платять за запуск процесів і копіювання, але мають сенс лише без блокування GIL
+    if _gil_disabled() or (engine in _GIL_RELEASING_ENGINES and np is not None):
+        return "thread"
+    return "process"
+
+
+def _chunk_bounds(length: int, chunk_size: int) -> List[Tuple[int, int]]:
+    step = max(16, chunk_size - chunk_size % 16)
+    return [(start, min(start + step, length)) for start in range(0, length, step)]
+
+
+def _shm_crypt_chunk(name: str, key: bytes, engine: str, decrypt: bool, start: int, stop: int) -> None:
+    """Обробка частини спільного буфера «на місці» у процесі-виконавці."""
+    # Виконавці успадковують resource_tracker батьківського процесу, тож сегмент видаляє лише його творець
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = shm.buf[start:stop]
+        try:
+            cipher = get_cipher(key, engine)
+            cipher._crypt_into(view, view, cipher._rk_dec if decrypt else cipher._rk_enc)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+
+def _crypt_parallel(
+    length: int,
+    fill: Callable[[memoryview], None],
+    key: bytes,
+    engine: str,
+    decrypt: bool,
+    workers: Optional[int],
+    chunk_size: int,
+    executor: str,
+) -> bytes:
+    """Паралельна обробка length байтів цілих блоків; fill записує вхідні дані у робочий буфер."""
+    cipher = get_cipher(key, engine)
+    mode = _resolve_executor(executor, cipher.engine)
+    bounds = _chunk_bounds(length, chunk_size)
+    workers = min(workers or os.cpu_count() or 1, len(bounds))
+    if mode == "process" and workers > 1:
+        shm = shared_memory.SharedMemory(create=True, size=length)
+        try:
+            with shm.buf[:length] as view:
+                fill(view)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_shm_crypt_chunk, shm.name, key, cipher.engine, decrypt, start, stop)
+                    for start, stop in bounds
+                ]
+                for future in futures:
+                    future.result()
+            return bytes(shm.buf[:length])
+        finally:
+            shm.close()
+            shm.unlink()
+    buf = bytearray(length)
+    round_keys = cipher._rk_dec if decrypt else cipher._rk_enc
+    with memoryview(buf) as view:
+        fill(view)
+        if workers <= 1:
+            cipher._crypt_into(view, view, round_keys)
+        else:
+            # Розклад ключів лише читається, тож один екземпляр SM4 спільний для всіх потоків без блокувань;
+            # розгорнуту функцію компілюємо заздалегідь, щоб потоки не робили цього одночасно
+            cipher._words_fn(round_keys)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(cipher._crypt_into, view[start:stop], view[start:stop], round_keys)
+                    for start, stop in bounds
+                ]
+                for future in futures:
+                    future.result()
+    return bytes(buf)
+
+
+def sm4_encrypt_ecb_parallel(
+    data: bytes,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = None,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    executor: str = "auto",
+) -> bytes:
+    """Паралельне шифрування ECB з PKCS#7 у пулі потоків або процесів (процеси — через спільну пам'ять)."""
+    src = memoryview(data).cast("B")
+    full = len(src) - len(src) % 16
+
+    def fill(view: memoryview) -> None:
+        view[:full] = src[:full]
+        view[full:] = pkcs7_pad(bytes(src[full:]), 16)
+
+    return _crypt_parallel(full + 16, fill, key, engine, False, workers, chunk_size, executor)
+
+
+def sm4_decrypt_ecb_parallel(
+    data: bytes,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = None,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    executor: str = "auto",
+) -> bytes:
+    """Паралельне розшифрування ECB з видаленням PKCS#7 у пулі потоків або процесів."""
+    if not data or len(data) % 16 != 0:
+        raise ValueError(
+            "Довжина шифртексту повинна бути кратною 16 байтам (розмір блоку SM4).\n"
+            "Переконайтеся, що файл не був обрізаний або пошкоджений."
+        )
+    src = memoryview(data).cast("B")
+    full = len(src) - 16
+    # Останній блок перевіряється до запуску пулу: неправильний ключ виявляється одразу
+    tail = sm4_decrypt_ecb_tail(src[full:], key, engine)
+    if not full:
+        return tail
+
+    def fill(view: memoryview) -> None:
+        view[:] = src[:full]
+
+    return _crypt_parallel(full, fill, key, engine, True, workers, chunk_size, executor) + tail
+
+
+def _xor_bytes(a: bytes, b: bytes) -> bytes:
+    """XOR двох буферів однакової довжини через довгі цілі (лінійно, без циклу Python)."""
+    n = len(a)
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(n, "big")
+
+
+def _ctr_counter_blocks(nonce: bytes, block_offset: int, nblocks: int) -> bytes:
+    """Лічильникові блоки nonce ‖ counter(i) для i від block_offset (лічильник — big-endian)."""
+    if not 8 <= len(nonce) <= 15:
+        raise ValueError(
+            f"Nonce для CTR має довжину {len(nonce)} байтів.\n"
+            "Потрібно від 8 до 15 байтів; решта 16-байтового блоку відводиться під лічильник."
+        )
+    width = 16 - len(nonce)
+    if block_offset < 0 or block_offset + nblocks > 1 << (8 * width):
+        raise ValueError(
+            "Лічильник CTR вийшов за допустимі межі для цього nonce.\n"
+            "Використайте коротший nonce або зашифруйте дані частинами з різними nonce."
+        )
+    nonce = bytes(nonce)
+    return b"".join(nonce + i.to_bytes(width, "big") for i in range(block_offset, block_offset + nblocks))
+
+
+def sm4_ctr_keystream(
+    key: bytes,
+    nonce: bytes,
+    block_offset: int,
+    nblocks: int,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    executor: str = "auto",
+) -> bytes:
+    """Потік ключа CTR для блоків [block_offset, block_offset + nblocks): блок i = E_K(nonce ‖ i)."""
+    counters = _ctr_counter_blocks(nonce, block_offset, nblocks)
+    if not nblocks:
+        return b""
+
+    def fill(view: memoryview) -> None:
+        view[:] = counters
+
+    return _crypt_parallel(len(counters), fill, key, engine, False, workers, chunk_size, executor)
+
+
+def sm4_encrypt_ctr(
+    data: bytes,
+    key: bytes,
+    nonce: bytes,
+    block_offset: int = 0,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    executor: str = "auto",
+) -> bytes:
+    """Шифрування у режимі CTR без доповнення: довжина результату дорівнює довжині даних.
+
+    block_offset дозволяє почати з довільного блоку потоку (наприклад, для дописування чи
+    розшифрування фрагмента файлу); workers > 1 розподіляє генерацію потоку ключа між виконавцями.
+    """
+    nblocks = (len(data) + 15) // 16
+    stream = sm4_ctr_keystream(key, nonce, block_offset, nblocks, engine, workers, chunk_size, executor)
+    return _xor_bytes(data, stream[:len(data)])
+
+
+def sm4_decrypt_ctr(
+    data: bytes,
+    key: bytes,
+    nonce: bytes,
+    block_offset: int = 0,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    executor: str = "auto",
+) -> bytes:
+    """Розшифрування у режимі CTR — та сама операція XOR з потоком ключа, що й шифрування."""
+    return sm4_encrypt_ctr(data, key, nonce, block_offset, engine, workers, chunk_size, executor)
+
+
+class KeystreamPool:
+    """Фонове попереднє обчислення потоку ключа CTR: шифрування повідомлення — лише XOR.
+
+    Фоновий потік заповнює обмежене кільце блоків потоку ключа для заданих ключа й nonce.
+    Кожне повідомлення отримує власний неперервний діапазон лічильника, що починається з межі
+    блоку; залишок останнього блоку відкидається, тож жоден фрагмент потоку не використовується двічі.
+    Якщо в кільці бракує потоку, він обчислюється одразу на новому діапазоні лічильника (промах).
+    Короткі ділянки потоку, які не можуть обслужити запити, відкидаються (dropped_blocks у stats()).
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        nonce: bytes,
+        capacity_blocks: int = 1 << 14,
+        refill_blocks: int = 1 << 11,
+        engine: str = DEFAULT_ENGINE,
+        block_offset: int = 0,
+    ) -> None:
+        _ctr_counter_blocks(nonce, block_offset, 0)
+        if refill_blocks < 1 or capacity_blocks < refill_blocks:
+            raise ValueError("Місткість пулу повинна бути не меншою за розмір поповнення (і більшою за 0).")
+        self._cipher = get_cipher(key, engine)
+        self._nonce = bytes(nonce)
+        self.capacity_blocks = capacity_blocks
+        self.refill_blocks = refill_blocks
+        self._next_block = block_offset  # перший ще не зарезервований блок лічильника
+        self._segments: "deque[Tuple[int, bytes]]" = deque()  # (перший блок, потік ключа)
+        self._pooled_blocks = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_seconds = 0.0
+        self.dropped_blocks = 0
+        self._thread = threading.Thread(target=self._run, name="sm4-keystream-pool", daemon=True)
+        self._thread.start()
+
+    def _reserve(self, nblocks: int) -> int:
+        # Викликається під self._cond: діапазони лічильника видаються лише зростаючими
+        first = self._next_block
+        if first + nblocks > 1 << (8 * (16 - len(self._nonce))):
+            raise ValueError(
+                "Лічильник CTR вийшов за допустимі межі для цього nonce.\n"
+                "Створіть новий пул з іншим nonce."
+            )
+        self._next_block = first + nblocks
+        return first
+
+    def _generate(self, first: int, nblocks: int) -> bytes:
+        return self._cipher.encrypt_blocks(_ctr_counter_blocks(self._nonce, first, nblocks))
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and self._pooled_blocks + self.refill_blocks > self.capacity_blocks:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                try:
+                    first = self._reserve(self.refill_blocks)
+                except ValueError:
+                    return
+            started = time.perf_counter()
+            stream = self._generate(first, self.refill_blocks)
+            elapsed = time.perf_counter() - started
+            with self._cond:
+                # close() міг спрацювати під час обчислення: потік ключа закритого пулу не зберігається
+                if self._closed:
+                    return
+                self._segments.append((first, stream))
+                self._pooled_blocks += self.refill_blocks
+                self.refills += 1
+                self.refill_seconds += elapsed
+                self._cond.notify_all()
+
+    def _drop_head(self, count: int) -> None:
+        # Відкидання перших count сегментів: невикористаний потік ключа просто втрачається, лічильник не повторюється
+        for _ in range(count):
+            _, stream = self._segments.popleft()
+            self._pooled_blocks -= len(stream) // 16
+            self.dropped_blocks += len(stream) // 16
+        self._cond.notify_all()
+
+    def _take_pooled(self, nblocks: int) -> Optional[Tuple[int, bytes]]:
+        # Під self._cond: кільце може складатися з кількох неперервних ділянок (промах резервує діапазон
+        # посередині). Обслуговуємо першу ділянку достатньої довжини, а коротші ділянки перед нею
+        # відкидаємо — інакше вони назавжди займали б місткість і фоновий потік перестав би поповнювати пул.
+        if self._pooled_blocks < nblocks or not self._segments:
+            return None
+        run_index = 0
+        expected = None
+        have = 0
+        for index, (start, stream) in enumerate(self._segments):
+            if start != expected:
+                run_index, have = index, 0
+            expected = start + len(stream) // 16
+            have += len(stream) // 16
+            if have >= nblocks:
+                break
+        if have < nblocks:
+            return None
+        self._drop_head(run_index)
+        first = self._segments[0][0]
+        parts = []
+        need = nblocks
+        while need:
+            start, stream = self._segments.popleft()
+            count = len(stream) // 16
+            if count > need:
+                parts.append(stream[:16 * need])
+                self._segments.appendleft((start + need, stream[16 * need:]))
+                count = need
+            else:
+                parts.append(stream)
+            need -= count
+        self._pooled_blocks -= nblocks
+        self._cond.notify_all()
+        return first, b"".join(parts)
+
+    def take(self, nbytes: int) -> Tuple[int, bytes]:
+        """Видача nbytes потоку ключа. Повертає (номер першого блоку лічильника, потік ключа)."""
+        nblocks = (nbytes + 15) // 16
+        with self._cond:
+            if self._closed:
+                raise ValueError("Пул потоку ключа закрито.")
+            pooled = self._take_pooled(nblocks)
+            if pooled is not None:
+                self.hits += 1
+                first, stream = pooled
+                return first, stream[:nbytes]
+            self.misses += 1
+            # Потоку в пулі достатньо, але жодна ділянка не вміщує запит (фрагментація); якщо пул заповнений,
+            # звільняємо найстарішу ділянку, щоб фоновий потік продовжив поповнення за новим діапазоном.
+            # Запит, більший за весь потік у пулі, не обслужила б жодна ділянка — тоді нічого не відкидаємо
+            if (
+                self._segments
+                and self._pooled_blocks >= nblocks
+                and self._pooled_blocks + self.refill_blocks > self.capacity_blocks
+            ):
+                first_start = self._segments[0][0]
+                expected = first_start
+                count = 0
+                for start, stream in self._segments:
+                    if start != expected:
+                        break
+                    expected = start + len(stream) // 16
+                    count += 1
+                self._drop_head(count)
+            first = self._reserve(nblocks)
+        return first, self._generate(first, nblocks)[:nbytes]
+
+    def encrypt(self, data: bytes) -> Tuple[int, bytes]:
+        """Шифрування CTR з пулу. Повертає (block_offset, шифртекст) для sm4_decrypt_ctr."""
+        first, stream = self.take(len(data))
+        return first, _xor_bytes(data, stream)
+
+    def stats(self) -> Dict[str, float]:
+        """Статистика: влучання, промахи, частка влучань, поповнення та їх середня тривалість (с)."""
+        with self._cond:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "refills": self.refills,
+                "avg_refill_seconds": self.refill_seconds / self.refills if self.refills else 0.0,
+                "pooled_blocks": self._pooled_blocks,
+                "dropped_blocks": self.dropped_blocks,
+            }
+
+    def close(self) -> None:
+        """Зупинка фонового потоку й відкидання невикористаного потоку ключа."""
+        with self._cond:
+            self._closed = True
+            self._segments.clear()
+            self._pooled_blocks = 0
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "KeystreamPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _check_iv(iv: bytes) -> None:
+    if len(iv) != 16:
+        raise ValueError(
+            f"Вектор ініціалізації (IV) має довжину {len(iv)} байтів.\n"
+            "Для режиму CBC потрібен IV рівно 16 байтів (32 HEX-символи)."
+        )
+
+
+# Компіляція розгорнутої функції (~2 мс) окупається приблизно з такої кількості блоків
+_UNROLLED_MIN_BLOCKS = 512
+
+
+def _serial_words_fn(key: bytes, engine: str, nblocks: int) -> Callable[[int, int, int, int], Tuple[int, int, int, int]]:
+    """Функція 32 раундів для послідовних режимів, де пакетні рушії не застосовні.
+
+    Для "numpy" і "bitslice" (окремі блоки яких ідуть через T-таблиці) використовується розгорнута
+    функція, якщо вона вже є в кеші ключів або повідомлення достатньо довге, щоб окупити компіляцію.
+    """
+    cipher = get_cipher(key, engine)
+    if engine in _BULK_ENGINES:
+        unrolled = get_cipher(key, "unrolled")
+        if (
+            nblocks >= _UNROLLED_MIN_BLOCKS
+            or key_schedule_cache.peek_compiled(unrolled._cache_digest, "enc") is not None
+        ):
+            cipher = unrolled
+    return cipher._words_fn(cipher._rk_enc)
+
+
+def sm4_encrypt_cbc(data: bytes, key: bytes, iv: bytes, engine: str = DEFAULT_ENGINE) -> bytes:
+    """Шифрування у режимі CBC з PKCS#7-доповненням.
+
+    Ланцюжок блоків послідовний за визначенням, тому пакетні рушії тут не допомагають:
+    блоки шифруються по одному найшвидшою доступною функцією (див. _serial_words_fn).
+    """
+    _check_iv(iv)
     padded = pkcs7_pad(data, 16)
-    out = bytearray()
-    for i in range(0, len(padded), 16):
-        out.extend(cipher.encrypt_block(padded[i:i + 16]))
+    words = _serial_words_fn(key, engine, len(padded) // 16)
+    out = bytearray(len(padded))
+    pack_into = _BLOCK.pack_into
+    c0, c1, c2, c3 = _BLOCK.unpack(iv)
+    offset = 0
+    for p0, p1, p2, p3 in _BLOCK.iter_unpack(padded):
+        c0, c1, c2, c3 = words(p0 ^ c0, p1 ^ c1, p2 ^ c2, p3 ^ c3)
+        pack_into(out, offset, c0, c1, c2, c3)
+        offset += 16
     return bytes(out)
 
 
-def sm4_decrypt_ecb(data: bytes, key: bytes) -> bytes:
-    """Розшифрування даних у режимі ECB з видаленням PKCS#7-доповнення."""
-    if len(data) % 16 != 0:
+def sm4_decrypt_cbc(
+    data: bytes,
+    key: bytes,
+    iv: bytes,
+    engine: str = DEFAULT_ENGINE,
+    workers: Optional[int] = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    executor: str = "auto",
+) -> bytes:
+    """Розшифрування у режимі CBC з видаленням PKCS#7-доповнення.
+
+    Кожен блок відкритого тексту залежить лише від двох блоків шифртексту, тому всі блоки
+    розшифровуються одним пакетом (workers > 1 — паралельно), а потім XOR зі зсунутим шифртекстом.
+    """
+    _check_iv(iv)
+    if not data or len(data) % 16 != 0:
         raise ValueError(
             "Довжина шифртексту повинна бути кратною 16 байтам (розмір блоку SM4).\n"
             "Переконайтеся, що файл не був обрізаний або пошкоджений."
         )
-    cipher = SM4(key)
-    out = bytearray()
-    for i in range(0, len(data), 16):
-        out.extend(cipher.decrypt_block(data[i:i + 16]))
-    return pkcs7_unpad(bytes(out), 16)
+    src = memoryview(data).cast("B")
+    full = len(src) - 16
+    prev_last = bytes(src[full - 16:full]) if full else bytes(iv)
+    # Спершу перевіряємо доповнення останнього блоку, щоб не розшифровувати все з неправильним ключем
+    pkcs7_unpad(_xor_bytes(get_cipher(key, engine).decrypt_block(bytes(src[full:])), prev_last), 16)
+
+    def fill(view: memoryview) -> None:
+        view[:] = src
+
+    decrypted = _crypt_parallel(len(src), fill, key, engine, True, workers, chunk_size, executor)
+    return pkcs7_unpad(_xor_bytes(decrypted, bytes(iv) + bytes(src[:full])), 16)
+
+
+class InterleavedCBC:
+    """Планувальник, що просуває багато незалежних потоків CBC-шифрування синхронно.
+
+    У межах одного потоку CBC послідовний, але на кожному кроці наступні блоки всіх активних
+    потоків збираються в один пакет для векторизованого чи бітслайсингового рушія.
+    Використання: add_stream(iv) → update(id, дані) → run() → finalize(id).
+    """
+
+    def __init__(self, key: bytes, engine: str = DEFAULT_ENGINE) -> None:
+        self._cipher = get_cipher(key, engine)
+        self._prev: Dict[int, int] = {}
+        self._pending: Dict[int, bytearray] = {}
+        self._output: Dict[int, bytearray] = {}
+        self._next_id = 0
+
+    def add_stream(self, iv: bytes) -> int:
+        """Реєстрація нового потоку з власним IV. Повертає номер потоку."""
+        _check_iv(iv)
+        stream_id = self._next_id
+        self._next_id += 1
+        self._prev[stream_id] = int.from_bytes(iv, "big")
+        self._pending[stream_id] = bytearray()
+        self._output[stream_id] = bytearray()
+        return stream_id
+
+    def _stream(self, stream_id: int) -> bytearray:
+        pending = self._pending.get(stream_id)
+        if pending is None:
+            raise ValueError(f"Потік CBC №{stream_id} не зареєстровано або вже завершено.")
+        return pending
+
+    def update(self, stream_id: int, data: bytes) -> None:
+        """Додавання відкритого тексту до черги потоку (шифрується під час run())."""
+        self._stream(stream_id).extend(data)
+
+    def _advance(self) -> None:
+        # Шифрування всіх повних блоків у чергах; шифртекст накопичується в _output до видачі
+        cursor = {sid: 0 for sid in self._pending}
+        while True:
+            active = [sid for sid, buf in self._pending.items() if len(buf) - cursor[sid] >= 16]
+            if not active:
+                break
+            batch = []
+            for sid in active:
+                offset = cursor[sid]
+                block = int.from_bytes(self._pending[sid][offset:offset + 16], "big")
+                batch.append((block ^ self._prev[sid]).to_bytes(16, "big"))
+                cursor[sid] = offset + 16
+            if len(batch) < _NUMPY_MIN_BLOCKS:
+                # Малий пакет вигідніше обробити рушієм окремих блоків
+                encrypted = b"".join(self._cipher.encrypt_block(b) for b in batch)
+            else:
+                encrypted = self._cipher.encrypt_blocks(b"".join(batch))
+            for i, sid in enumerate(active):
+                block = encrypted[16 * i:16 * i + 16]
+                self._prev[sid] = int.from_bytes(block, "big")
+                self._output[sid] += block
+        for sid, buf in self._pending.items():
+            del buf[:cursor[sid]]
+
+    def run(self) -> Dict[int, bytes]:
+        """Шифрування всіх повних блоків у чергах кроками «по блоку з кожного потоку».
+
+        Повертає для кожного потоку шифртекст, ще не виданий попередніми run() чи finalize().
+        """
+        self._advance()
+        result = {}
+        for sid, output in self._output.items():
+            result[sid] = bytes(output)
+            output.clear()
+        return result
+
+    def _pad(self, stream_id: int) -> None:
+        pending = self._stream(stream_id)
+        pad_len = 16 - len(pending) % 16
+        pending.extend(bytes([pad_len]) * pad_len)
+
+    def finalize(self, stream_id: int) -> bytes:
+        """Доповнення PKCS#7 і завершення потоку; повертає весь ще не виданий шифртекст потоку.
+
+        Блоки інших потоків, зашифровані в тому ж проході, лишаються в них до наступного run() чи finalize().
+        """
+        self._pad(stream_id)
+        self._advance()
+        out = bytes(self._output[stream_id])
+        del self._pending[stream_id], self._prev[stream_id], self._output[stream_id]
+        return out
+
+
+def sm4_encrypt_cbc_many(
+    messages: List[bytes],
+    key: bytes,
+    ivs: List[bytes],
+    engine: str = DEFAULT_ENGINE,
+) -> List[bytes]:
+    """CBC-шифрування багатьох незалежних повідомлень із чергуванням потоків у спільних пакетах."""
+    if len(messages) != len(ivs):
+        raise ValueError("Кількість повідомлень повинна збігатися з кількістю векторів ініціалізації.")
+    scheduler = InterleavedCBC(key, engine)
+    ids = [scheduler.add_stream(iv) for iv in ivs]
+    for sid, message in zip(ids, messages):
+        scheduler.update(sid, message)
+        scheduler._pad(sid)
+    # Усі потоки доповнені заздалегідь, тож один run() шифрує їх повністю
+    out = scheduler.run()
+    return [out[sid] for sid in ids]
+
+
+# GHASH для GCM: множення в GF(2^128) на ключ H через 16 таблиць по 256 добутків (по одній на
+# позицію байта), тож одне множення — 16 звертань до таблиць і XOR замість 128 побітових кроків
+_GCM_R = 0xE1 << 120
+_GHASH_BLOCK = struct.Struct(">QQ")
+
+
+@lru_cache(maxsize=16)
+def _ghash_tables(h: int) -> Tuple[Tuple[int, ...], ...]:
+    powers = []
+    v = h
+    for _ in range(128):
+        powers.append(v)
+        v = (v >> 1) ^ _GCM_R if v & 1 else v >> 1
+    tables = []
+    for j in range(16):
+        table = [0] * 256
+        for b in range(1, 256):
+            low = b & -b
+            table[b] = table[b ^ low] ^ powers[8 * j + 8 - low.bit_length()]
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+def _ghash(tables: Tuple[Tuple[int, ...], ...], y: int, data: bytes) -> int:
+    """Продовження GHASH зі стану y для даних, кратних 16 байтам."""
+    T0, T1, T2, T3, T4, T5, T6, T7, T8, T9, T10, T11, T12, T13, T14, T15 = tables
+    for hi, lo in _GHASH_BLOCK.iter_unpack(data):
+        b = (y ^ (hi << 64 | lo)).to_bytes(16, "big")
+        y = (
+            T0[b[0]] ^ T1[b[1]] ^ T2[b[2]] ^ T3[b[3]] ^ T4[b[4]] ^ T5[b[5]] ^ T6[b[6]] ^ T7[b[7]]
+            ^ T8[b[8]] ^ T9[b[9]] ^ T10[b[10]] ^ T11[b[11]] ^ T12[b[12]] ^ T13[b[13]] ^ T14[b[14]] ^ T15[b[15]]
+        )
+    return y
+
+
+class SM4GCM:
+    """Автентифіковане шифрування SM4-GCM (AEAD) з потоковою обробкою AAD і даних.
+
+    Один об'єкт обслуговує одне повідомлення: update_aad() (до першого update()), update() —
+    скільки завгодно разів, finalize() — повертає тег (шифрування) або перевіряє його (розшифрування).
+    Під час потокового розшифрування відкритий текст не можна використовувати до успішного finalize().
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        iv: bytes,
+        decrypt: bool = False,
+        engine: str = DEFAULT_ENGINE,
+        tag_length: int = 16,
+    ) -> None:
+        if not iv:
+            raise ValueError("Вектор ініціалізації (IV) для GCM не може бути порожнім.")
+        if not 12 <= tag_length <= 16:
+            raise ValueError("Довжина тегу GCM повинна бути від 12 до 16 байтів.")
+        self._cipher = get_cipher(key, engine)
+        self._decrypt = decrypt
+        self._tag_length = tag_length
+        self._tables = _ghash_tables(int.from_bytes(self._cipher.encrypt_block(bytes(16)), "big"))
+        if len(iv) == 12:
+            j0 = bytes(iv) + b"\x00\x00\x00\x01"
+        else:
+            iv_block = bytes(iv) + bytes(-len(iv) % 16) + (8 * len(iv)).to_bytes(16, "big")
+            j0 = _ghash(self._tables, 0, iv_block).to_bytes(16, "big")
+        self._j0 = j0
+        self._prefix = j0[:12]
+        self._counter = (int.from_bytes(j0[12:], "big") + 1) & 0xFFFFFFFF
+        self._y = 0
+        self._aad_len = 0
+        self._data_len = 0
+        self._pending = b""  # неповний блок для GHASH (AAD або шифртекст)
+        self._keystream = b""  # невикористаний залишок потоку ключа
+        self._aad_done = False
+        self._finalized = False
+
+    def _check_active(self) -> None:
+        if self._finalized:
+            raise ValueError("Обробку GCM уже завершено: для нового повідомлення створіть новий об'єкт.")
+
+    def _absorb(self, data: bytes) -> None:
+        buf = self._pending + bytes(data)
+        full = len(buf) - len(buf) % 16
+        if full:
+            self._y = _ghash(self._tables, self._y, buf[:full])
+        self._pending = buf[full:]
+
+    def _flush_pending(self) -> None:
+        if self._pending:
+            self._y = _ghash(self._tables, self._y, self._pending + bytes(16 - len(self._pending)))
+            self._pending = b""
+
+    def update_aad(self, data: bytes) -> None:
+        """Додавання автентифікованих, але не зашифрованих даних (AAD)."""
+        self._check_active()
+        if self._aad_done:
+            raise ValueError("AAD потрібно передати до початку шифрування/розшифрування даних.")
+        self._aad_len += len(data)
+        self._absorb(data)
+
+    def _next_keystream(self, n: int) -> bytes:
+        ks = self._keystream
+        if n > len(ks):
+            nblocks = (n - len(ks) + 15) // 16
+            if (self._data_len + len(ks)) // 16 + nblocks > 0xFFFFFFFE:
+                raise ValueError("Повідомлення завелике для одного IV у режимі GCM.")
+            prefix, c = self._prefix, self._counter
+            counters = b"".join(prefix + ((c + i) & 0xFFFFFFFF).to_bytes(4, "big") for i in range(nblocks))
+            self._counter = (c + nblocks) & 0xFFFFFFFF
+            ks += self._cipher.encrypt_blocks(counters)
+        self._keystream = ks[n:]
+        return ks[:n]
+
+    def _end_aad(self) -> None:
+        if not self._aad_done:
+            self._flush_pending()
+            self._aad_done = True
+
+    def _hash_ciphertext(self, ct: bytes) -> None:
+        self._end_aad()
+        self._data_len += len(ct)
+        self._absorb(ct)
+
+    def update(self, data: bytes) -> bytes:
+        """Шифрування або розшифрування чергової порції даних; повертає стільки ж байтів."""
+        self._check_active()
+        self._end_aad()
+        data = bytes(data)
+        if not data:
+            return b""
+        out = _xor_bytes(data, self._next_keystream(len(data)))
+        self._hash_ciphertext(data if self._decrypt else out)
+        return out
+
+    def _tag(self) -> bytes:
+        self._end_aad()
+        self._flush_pending()
+        lengths = (8 * self._aad_len).to_bytes(8, "big") + (8 * self._data_len).to_bytes(8, "big")
+        s = _ghash(self._tables, self._y, lengths).to_bytes(16, "big")
+        self._finalized = True
+        return _xor_bytes(self._cipher.encrypt_block(self._j0), s)[:self._tag_length]
+
+    def finalize(self, tag: Optional[bytes] = None) -> bytes:
+        """Завершення: при шифруванні повертає тег, при розшифруванні перевіряє переданий тег."""
+        self._check_active()
+        expected = self._tag()
+        if not self._decrypt:
+            return expected
+        if tag is None or not hmac.compare_digest(expected, bytes(tag)):
+            raise ValueError(
+                "Перевірка автентичності GCM не пройдена.\n"
+                "Можливі причини:\n"
+                " • використано неправильний ключ або IV;\n"
+                " • шифртекст, тег чи додаткові дані (AAD) пошкоджено або змінено."
+            )
+        return expected
+
+
+def sm4_gcm_encrypt(
+    data: bytes,
+    key: bytes,
+    iv: bytes,
+    aad: bytes = b"",
+    engine: str = DEFAULT_ENGINE,
+) -> Tuple[bytes, bytes]:
+    """Шифрування SM4-GCM за один прохід. Повертає (шифртекст, тег)."""
+    gcm = SM4GCM(key, iv, engine=engine)
+    gcm.update_aad(aad)
+    ct = gcm.update(data)
+    return ct, gcm.finalize()
+
+
+def sm4_gcm_decrypt(
+    data: bytes,
+    key: bytes,
+    iv: bytes,
+    tag: bytes,
+    aad: bytes = b"",
+    engine: str = DEFAULT_ENGINE,
+) -> bytes:
+    """Розшифрування SM4-GCM: тег перевіряється до розшифрування, тож підроблені дані не розшифровуються."""
+    verifier = SM4GCM(key, iv, decrypt=True, engine=engine, tag_length=len(tag))
+    verifier.update_aad(aad)
+    verifier._hash_ciphertext(data)
+    verifier.finalize(tag)
+    return SM4GCM(key, iv, engine=engine).update(data)
+
+
+class SM4XTS:
+    """Режим SM4-XTS для секторів: кожен сектор шифрується незалежно з твіком від його номера.
+
+    Ключ — 32 байти (ключ даних ‖ ключ твіку). Розмір сектора повинен бути кратним 16 байтам,
+    тому крадіжка шифртексту не потрібна. Довільний діапазон секторів обробляється одним
+    пакетом блокових рушіїв (workers > 1 — паралельно).
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        sector_size: int = 4096,
+        engine: str = DEFAULT_ENGINE,
+        workers: Optional[int] = 1,
+        executor: str = "auto",
+    ) -> None:
+        if len(key) != 32:
+            raise ValueError(
+                f"Ключ SM4-XTS має довжину {len(key)} байтів.\n"
+                "Потрібно рівно 32 байти: 16 байтів ключа даних і 16 байтів ключа твіку."
+            )
+        if key[:16] == key[16:]:
+            raise ValueError("Ключ даних і ключ твіку SM4-XTS не повинні збігатися.")
+        if sector_size < 16 or sector_size % 16 != 0:
+            raise ValueError("Розмір сектора XTS повинен бути додатним і кратним 16 байтам.")
+        self.sector_size = sector_size
+        self.engine = engine
+        self.workers = workers
+        self.executor = executor
+        self._data_key = bytes(key[:16])
+        self._data_cipher = get_cipher(self._data_key, engine)
+        self._tweak_cipher = get_cipher(bytes(key[16:]), engine)
+
+    def _tweaks(self, first_sector: int, count: int) -> bytes:
+        """Твіки для всіх блоків секторів: T = E_K2(номер сектора), далі T·α для кожного блоку."""
+        numbers = b"".join(n.to_bytes(16, "little") for n in range(first_sector, first_sector + count))
+        encrypted = self._tweak_cipher.encrypt_blocks(numbers)
+        per_sector = self.sector_size // 16
+        out = []
+        for i in range(count):
+            t = int.from_bytes(encrypted[16 * i:16 * i + 16], "little")
+            for _ in range(per_sector):
+                out.append(t.to_bytes(16, "little"))
+                t = ((t << 1) ^ 0x87) & ((1 << 128) - 1) if t >> 127 else t << 1
+        return b"".join(out)
+
+    def _crypt(self, first_sector: int, data: bytes, decrypt: bool) -> bytes:
+        if first_sector < 0 or len(data) % self.sector_size != 0:
+            raise ValueError(
+                f"Дані для XTS повинні складатися з цілих секторів по {self.sector_size} байтів."
+            )
+        if not data:
+            return b""
+        tweaks = self._tweaks(first_sector, len(data) // self.sector_size)
+        masked = _xor_bytes(data, tweaks)
+        if self.workers == 1:
+            cipher = self._data_cipher
+            done = cipher.decrypt_blocks(masked) if decrypt else cipher.encrypt_blocks(masked)
+        else:
+            def fill(view: memoryview) -> None:
+                view[:] = masked
+
+            done = _crypt_parallel(
+                len(masked), fill, self._data_key, self.engine, decrypt,
+                self.workers, PARALLEL_CHUNK_SIZE, self.executor,
+            )
+        return _xor_bytes(done, tweaks)
+
+    def encrypt_sectors(self, first_sector: int, data: bytes) -> bytes:
+        """Шифрування послідовних секторів, починаючи з номера first_sector."""
+        return self._crypt(first_sector, data, False)
+
+    def decrypt_sectors(self, first_sector: int, data: bytes) -> bytes:
+        """Розшифрування послідовних секторів, починаючи з номера first_sector."""
+        return self._crypt(first_sector, data, True)
 
 
 def generate_key() -> bytes:
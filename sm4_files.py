@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple, Union
+import os
+import secrets
+import struct
+
+from sm4_core import (
+    DEFAULT_ENGINE,
+    SM4XTS,
+    WrongKeyError,
+    get_cipher,
+    pkcs7_pad,
+    sm4_decrypt_ecb_tail,
+)
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+
+class EncryptedVolume:
+    """Зашифрований том (образ диска, файл бази даних) із довільним доступом до секторів.
+
+    Кожен сектор зашифровано SM4-XTS незалежно, тому читання чи запис діапазону байтів
+    торкається лише секторів, що його покривають, а не всього файлу.
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        key: bytes,
+        sector_size: int = 4096,
+        engine: str = DEFAULT_ENGINE,
+        workers: Optional[int] = 1,
+    ) -> None:
+        self.path = Path(path)
+        self.sector_size = sector_size
+        self._xts = SM4XTS(key, sector_size, engine, workers)
+        self._file = open(self.path, "r+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size % sector_size != 0:
+            self._file.close()
+            raise ValueError(
+                f"Розмір тому ({size} байтів) не кратний розміру сектора ({sector_size} байтів).\n"
+                "Можливо, файл пошкоджений або створений з іншим розміром сектора."
+            )
+
+    @classmethod
+    def create(
+        cls,
+        path: PathLike,
+        key: bytes,
+        size: int,
+        sector_size: int = 4096,
+        engine: str = DEFAULT_ENGINE,
+        workers: Optional[int] = 1,
+    ) -> "EncryptedVolume":
+        """Створення нового тому розміром size байтів (округлюється до цілих секторів), заповненого нулями."""
+        xts = SM4XTS(key, sector_size, engine, workers)
+        sectors = (size + sector_size - 1) // sector_size
+        batch = max(1, (1 << 20) // sector_size)
+        with open(path, "wb") as f:
+            for first in range(0, sectors, batch):
+                count = min(batch, sectors - first)
+                f.write(xts.encrypt_sectors(first, bytes(count * sector_size)))
+        return cls(path, key, sector_size, engine, workers)
+
+    @property
+    def size(self) -> int:
+        """Розмір тому в байтах."""
+        return os.fstat(self._file.fileno()).st_size
+
+    @property
+    def sectors(self) -> int:
+        """Кількість секторів тому."""
+        return self.size // self.sector_size
+
+    def _check_range(self, first: int, count: int) -> None:
+        if first < 0 or count < 0 or first + count > self.sectors:
+            raise ValueError(
+                f"Діапазон секторів [{first}, {first + count}) виходить за межі тому "
+                f"({self.sectors} секторів)."
+            )
+
+    def read_sectors(self, first: int, count: int) -> bytes:
+        """Читання й розшифрування count секторів, починаючи з first."""
+        self._check_range(first, count)
+        self._file.seek(first * self.sector_size)
+        data = self._file.read(count * self.sector_size)
+        return self._xts.decrypt_sectors(first, data)
+
+    def write_sectors(self, first: int, data: bytes) -> None:
+        """Шифрування й запис «на місці» цілих секторів, починаючи з first."""
+        if len(data) % self.sector_size != 0:
+            raise ValueError(
+                f"Дані для запису повинні складатися з цілих секторів по {self.sector_size} байтів."
+            )
+        self._check_range(first, len(data) // self.sector_size)
+        self._file.seek(first * self.sector_size)
+        self._file.write(self._xts.encrypt_sectors(first, data))
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Читання довільного діапазону байтів тому."""
+        if offset < 0 or size < 0 or offset + size > self.size:
+            raise ValueError("Діапазон байтів виходить за межі тому.")
+        if not size:
+            return b""
+        first = offset // self.sector_size
+        last = (offset + size - 1) // self.sector_size
+        plain = self.read_sectors(first, last - first + 1)
+        start = offset - first * self.sector_size
+        return plain[start:start + size]
+
+    def write(self, offset: int, data: bytes) -> None:
+        """Запис довільного діапазону байтів: крайні неповні сектори читаються, змінюються й шифруються заново."""
+        if offset < 0 or offset + len(data) > self.size:
+            raise ValueError("Діапазон байтів виходить за межі тому.")
+        if not data:
+            return
+        first = offset // self.sector_size
+        last = (offset + len(data) - 1) // self.sector_size
+        start = offset - first * self.sector_size
+        end = start + len(data)
+        span = (last - first + 1) * self.sector_size
+        if start == 0 and end == span:
+            self.write_sectors(first, bytes(data))
+            return
+        buf = bytearray(span)
+        # Розшифровуються лише перший і останній сектори, якщо їх перекрито частково
+        if start:
+            buf[:self.sector_size] = self.read_sectors(first, 1)
+        if end < span:
+            buf[span - self.sector_size:] = self.read_sectors(last, 1)
+        buf[start:end] = data
+        self.write_sectors(first, bytes(buf))
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "EncryptedVolume":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# Файли обробляються частинами цього розміру (кратним 16 байтам і сторінці 4 КіБ)
+FILE_CHUNK_SIZE = 4 << 20
+_PAGE = 4096
+
+# Права нових файлів, як у open(): mkstemp створює файли 0600 незалежно від umask.
+# Прочитати umask можна, лише змінивши його для всього процесу, тож це робиться один раз під час імпорту
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_NEW_FILE_MODE = 0o666 & ~_UMASK
+
+# Необов'язковий заголовок зашифрованого файлу (32 байти, вирівняний до блоку SM4):
+# магічні байти, версія, режим, доповнення, розмір частини, довжина відкритого тексту, KCV
+FILE_MAGIC = b"SM4F"
+HEADER_VERSION = 1
+MODE_ECB = 1
+PADDING_NONE = 0
+PADDING_PKCS7 = 1
+_HEADER = struct.Struct(">4sBBBxIQ8s4x")
+# Ненульовий блок: KCV не збігається з шифртекстом нульового блоку, який видно в дірках розріджених файлів
+_KCV_BLOCK = bytes(range(1, 17))
+
+
+class FileHeader(NamedTuple):
+    version: int
+    mode: int
+    padding: int
+    chunk_size: int
+    length: int
+    kcv: bytes
+
+
+def key_check_value(key: bytes, engine: str = DEFAULT_ENGINE) -> bytes:
+    """Контрольне значення ключа: перші 8 байтів шифртексту фіксованого блоку."""
+    return get_cipher(key, engine).encrypt_block(_KCV_BLOCK)[:8]
+
+
+def _parse_header(raw: bytes, size: int) -> Optional[FileHeader]:
+    if len(raw) < _HEADER.size or raw[:4] != FILE_MAGIC:
+        return None
+    _, version, mode, padding, chunk_size, length, kcv = _HEADER.unpack(raw[:_HEADER.size])
+    # Узгодженість полів і довжин відрізняє справжній заголовок від випадкового збігу в старому файлі
+    # без заголовка; лише після неї невідома версія вважається помилкою
+    body = length + 16 - length % 16 if padding == PADDING_PKCS7 else length
+    if mode != MODE_ECB or padding not in (PADDING_NONE, PADDING_PKCS7) or size - _HEADER.size != body:
+        return None
+    if version != HEADER_VERSION:
+        raise ValueError(
+            f"Непідтримувана версія заголовка файлу: {version}.\n"
+            "Файл створено новішою версією програми."
+        )
+    return FileHeader(version, mode, padding, chunk_size, length, kcv)
+
+
+def read_file_header(path: PathLike) -> Optional[FileHeader]:
+    """Заголовок зашифрованого файлу або None для старих файлів без заголовка."""
+    with open(path, "rb") as f:
+        return _parse_header(f.read(_HEADER.size), os.fstat(f.fileno()).st_size)
+
+
+def _extents(f, size: int) -> Iterator[Tuple[int, int, bool]]:
+    """Ділянки файлу (початок, кінець, це_дірка) з вирівнюванням дірок до меж блоку SM4.
+
+    Використовує SEEK_DATA/SEEK_HOLE; якщо ОС чи файлова система їх не підтримують,
+    увесь файл вважається даними.
+    """
+    seek_data = getattr(os, "SEEK_DATA", None)
+    seek_hole = getattr(os, "SEEK_HOLE", None)
+    holes = []
+    if seek_data is not None and seek_hole is not None:
+        fd = f.fileno()
+        pos = 0
+        try:
+            while pos < size:
+                hole = os.lseek(fd, pos, seek_hole)
+                if hole >= size:
+                    break
+                try:
+                    data = os.lseek(fd, hole, seek_data)
+                except OSError:  # ENXIO: дірка тягнеться до кінця файлу
+                    data = size
+                holes.append((hole, data))
+                pos = data
+        except OSError:
+            holes = []
+    # Останній неповний блок разом із доповненням завжди обробляється як дані
+    limit = size - size % 16
+    pos = 0
+    for start, end in holes:
+        start = (start + 15) // 16 * 16
+        end = min(end - end % 16, limit)
+        if end <= start:
+            continue
+        if start > pos:
+            yield pos, start, False
+        yield start, end, True
+        pos = end
+    if pos < size:
+        yield pos, size, False
+
+
+def encrypt_file_sparse(
+    src: PathLike,
+    dst: PathLike,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    chunk_size: int = FILE_CHUNK_SIZE,
+    padding: bool = True,
+    header: bool = False,
+) -> Dict[str, int]:
+    """Шифрування файлу в ECB без повного читання в пам'ять і з урахуванням розріджених ділянок.
+
+    Дірки (ділянки без даних на диску) не читаються й не шифруються: шифртекст нульового блоку
+    обчислюється один раз і записується заповненням. Без заголовка результат ідентичний
+    sm4_encrypt_ecb (або encrypt_blocks, якщо padding=False). header=True додає на початок
+    заголовок із параметрами й контрольним значенням ключа (див. FileHeader).
+    Повертає кількість байтів, оброблених як дані й як дірки.
+    """
+    cipher = get_cipher(key, engine)
+    chunk_size = max(16, chunk_size - chunk_size % 16)
+    zero_chunk = cipher.encrypt_blocks(bytes(16)) * (chunk_size // 16)
+    stats = {"data_bytes": 0, "hole_bytes": 0}
+    with open(src, "rb") as fin:
+        size = os.fstat(fin.fileno()).st_size
+        if not padding and size % 16 != 0:
+            raise ValueError("Без доповнення довжина файлу повинна бути кратною 16 байтам.")
+        with open(dst, "wb") as fout:
+            if header:
+                fout.write(_HEADER.pack(
+                    FILE_MAGIC, HEADER_VERSION, MODE_ECB,
+                    PADDING_PKCS7 if padding else PADDING_NONE,
+                    chunk_size, size, key_check_value(key, engine),
+                ))
+            full = size - size % 16
+            for start, end, hole in _extents(fin, size):
+                if hole:
+                    stats["hole_bytes"] += end - start
+                    remaining = end - start
+                    while remaining:
+                        n = min(remaining, chunk_size)
+                        fout.write(zero_chunk[:n])
+                        remaining -= n
+                    continue
+                fin.seek(start)
+                stop = min(end, full)
+                pos = start
+                while pos < stop:
+                    chunk = fin.read(min(chunk_size, stop - pos))
+                    fout.write(cipher.encrypt_blocks(chunk))
+                    pos += len(chunk)
+                stats["data_bytes"] += end - start
+            if padding:
+                fin.seek(full)
+                fout.write(cipher.encrypt_block(pkcs7_pad(fin.read(), 16)))
+    return stats
+
+
+def _read_tail(f, key: bytes, engine: str, padding: bool = True) -> Tuple[int, int, bytes]:
+    """Перевірка ключа: (початок шифртексту, початок останнього блоку, розшифрований останній блок).
+
+    padding задає доповнення лише для файлів без заголовка; інакше воно береться із заголовка.
+    """
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    header = _parse_header(f.read(_HEADER.size), size)
+    start = 0
+    padded = padding
+    if header is not None:
+        if header.kcv != key_check_value(key, engine):
+            raise WrongKeyError(
+                "Контрольне значення ключа в заголовку файлу не збігається — неправильний ключ."
+            )
+        start = _HEADER.size
+        padded = header.padding == PADDING_PKCS7
+    if (size - start) % 16 != 0 or (padded and size == start):
+        raise ValueError(
+            "Довжина шифртексту повинна бути кратною 16 байтам (розмір блоку SM4).\n"
+            "Переконайтеся, що файл не був обрізаний або пошкоджений."
+        )
+    if size == start:
+        return start, size, b""
+    f.seek(size - 16)
+    last = f.read(16)
+    if padded:
+        return start, size - 16, sm4_decrypt_ecb_tail(last, key, engine)
+    return start, size - 16, get_cipher(key, engine).decrypt_block(last)
+
+
+def check_encrypted_file(
+    path: PathLike,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    padding: bool = True,
+) -> int:
+    """Швидка перевірка ключа для ECB-файлу: за KCV із заголовка або за доповненням останнього блоку.
+
+    Для файлів без заголовка доповнення задає padding (за замовчуванням PKCS#7); без доповнення
+    і без заголовка ключ перевірити неможливо. Читається не більше двох блоків.
+    Повертає довжину відкритого тексту; піднімає WrongKeyError, якщо ключ, імовірно, неправильний.
+    """
+    with open(path, "rb") as f:
+        start, end, tail = _read_tail(f, key, engine, padding)
+        return end - start + len(tail)
+
+
+def decrypt_file_sparse(
+    src: PathLike,
+    dst: PathLike,
+    key: bytes,
+    engine: str = DEFAULT_ENGINE,
+    chunk_size: int = FILE_CHUNK_SIZE,
+    padding: bool = True,
+) -> Dict[str, int]:
+    """Розшифрування ECB-файлу частинами; нульові сторінки відкритого тексту стають дірками.
+
+    Заголовок (якщо є) визначається автоматично й задає доповнення; для файлів без заголовка
+    доповнення задає padding (за замовчуванням PKCS#7).
+
+    Сторінки шифртексту, що складаються лише з шифртексту нульового блоку, не розшифровуються:
+    у вихідному файлі на їх місці пропускається позиція, тож результат знову розріджений.
+    Останній блок перевіряється першим: за неправильного ключа (WrongKeyError) файл dst не створюється.
+    """
+    cipher = get_cipher(key, engine)
+    chunk_size = max(_PAGE, chunk_size - chunk_size % _PAGE)
+    zero_page = cipher.encrypt_blocks(bytes(_PAGE))
+    stats = {"data_bytes": 0, "hole_bytes": 0}
+    with open(src, "rb") as fin:
+        # Вихідний файл створюється лише після перевірки ключа
+        pos, full, tail = _read_tail(fin, key, engine, padding)
+        fin.seek(pos)
+        with open(dst, "wb") as fout:
+            while pos < full:
+                chunk = fin.read(min(chunk_size, full - pos))
+                # Сусідні не нульові сторінки розшифровуються одним пакетом
+                run_start = None
+                for offset in range(0, len(chunk), _PAGE):
+                    page = chunk[offset:offset + _PAGE]
+                    if len(page) == _PAGE and page == zero_page:
+                        if run_start is not None:
+                            fout.write(cipher.decrypt_blocks(chunk[run_start:offset]))
+                            stats["data_bytes"] += offset - run_start
+                            run_start = None
+                        fout.seek(_PAGE, os.SEEK_CUR)
+                        stats["hole_bytes"] += _PAGE
+                    elif run_start is None:
+                        run_start = offset
+                if run_start is not None:
+                    fout.write(cipher.decrypt_blocks(chunk[run_start:]))
+                    stats["data_bytes"] += len(chunk) - run_start
+                pos += len(chunk)
+            fout.write(tail)
+            fout.truncate()
+    return stats
+
+
+def verify_encrypted_file(
+    src: PathLike,
+    enc: PathLike,
+    key: bytes,
+    sample_blocks: int = 512,
+    full: bool = False,
+    defect_rate: float = 0.01,
+    engine: str = DEFAULT_ENGINE,
+    padding: bool = True,
+) -> Dict[str, float]:
+    """Перевірка зашифрованого ECB-файлу проти вихідного без повного розшифрування.
+
+    Розшифровуються sample_blocks випадкових блоків і останній блок із доповненням і
+    порівнюються з відповідними байтами src. confidence — імовірність виявити пошкодження,
+    якщо неправильними є частка defect_rate блоків: 1 - (1 - defect_rate) ** n.
+    full=True розшифровує й порівнює весь файл (confidence = 1). Для файлів без заголовка
+    доповнення задає padding (за замовчуванням PKCS#7).
+    """
+    cipher = get_cipher(key, engine)
+    with open(enc, "rb") as fenc, open(src, "rb") as fsrc:
+        start, end, tail = _read_tail(fenc, key, engine, padding)
+        if end - start + len(tail) != os.fstat(fsrc.fileno()).st_size:
+            raise ValueError(
+                "Довжина розшифрованих даних не збігається з розміром вихідного файлу.\n"
+                "Файл результату обрізаний, пошкоджений або створений з іншого файлу."
+            )
+        # Останній блок (з доповненням, якщо воно є) перевіряється завжди
+        last = 1 if os.fstat(fenc.fileno()).st_size > end else 0
+        mismatches = int(_read_at(fsrc, end - start, len(tail) + 16) != tail)
+        total = (end - start) // 16
+        if full or sample_blocks >= total:
+            fenc.seek(start)
+            for pos in range(0, end - start, FILE_CHUNK_SIZE):
+                plain = cipher.decrypt_blocks(fenc.read(min(FILE_CHUNK_SIZE, end - start - pos)))
+                expected = _read_at(fsrc, pos, len(plain))
+                if plain != expected:
+                    mismatches += sum(
+                        plain[i:i + 16] != expected[i:i + 16] for i in range(0, len(plain), 16)
+                    )
+            checked = total
+        else:
+            # Відсортовані індекси — читання йде вперед по обох файлах
+            indices = sorted(secrets.SystemRandom().sample(range(total), sample_blocks))
+            plain = cipher.decrypt_blocks(b"".join(_read_at(fenc, start + i * 16, 16) for i in indices))
+            for n, i in enumerate(indices):
+                mismatches += plain[n * 16:n * 16 + 16] != _read_at(fsrc, i * 16, 16)
+            checked = sample_blocks
+    checked += last
+    blocks = total + last
+    confidence = 1.0 if checked == blocks else 1.0 - (1.0 - defect_rate) ** checked
+    return {
+        "blocks": blocks,
+        "checked": checked,
+        "mismatches": mismatches,
+        "confidence": confidence,
+    }
+
+
+def _read_at(f, offset: int, size: int) -> bytes:
+    f.seek(offset)
+    return f.read(size)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+import hashlib
+import hmac
+import json
+import os
+import re
+import tempfile
+import urllib.parse
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необов'язковий: без нього межі частин шукаються чистим Python
+    np = None
+
+from sm4_core import DEFAULT_ENGINE, WrongKeyError, sm4_decrypt_ctr, sm4_encrypt_ctr
+from sm4_files import _NEW_FILE_MODE, key_check_value
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+STORE_VERSION = 1
+# Межі частин за замовчуванням: середній розмір — степінь двійки
+CHUNK_MIN_SIZE = 16 << 10
+CHUNK_AVG_SIZE = 64 << 10
+CHUNK_MAX_SIZE = 256 << 10
+# Файл читається буферами цього розміру; частина ніколи не перетинає межу буфера без дочитування
+_READ_SIZE = 8 << 20
+_MASK64 = (1 << 64) - 1
+# Символи, що кодуються в імені файлу маніфесту як %XX (UTF-8); решта назви зберігається як є
+_NAME_UNSAFE_RE = re.compile(r"[^\w.-]")
+# Запас до типового обмеження довжини імені файлу (255 байтів) з урахуванням «.json»
+_NAME_MAX_BYTES = 240
+
+
+def _derive(key: bytes, label: bytes) -> bytes:
+    """Окремий підключ для кожного призначення, отриманий з головного ключа через HMAC-SHA256."""
+    return hmac.new(key, b"sm4-store " + label, hashlib.sha256).digest()
+
+
+def gear_table(key: bytes) -> List[int]:
+    """Таблиця Gear (256 64-бітних значень), залежна від ключа сховища.
+
+    Ключова таблиця не дає сторонньому визначити межі частин (і за ними — вміст) з розмірів об'єктів.
+    """
+    seed = _derive(key, b"gear")
+    return [
+        int.from_bytes(hmac.new(seed, bytes([i]), hashlib.sha256).digest()[:8], "big")
+        for i in range(256)
+    ]
+
+
+def _masks(avg_size: int):
+    # Нормалізоване розбиття (FastCDC): до середнього розміру — жорсткіша маска, після — м'якша.
+    # Одиничні біти беруться зі старших розрядів, щоб хеш залежав від усього 64-байтового вікна.
+    bits = avg_size.bit_length() - 1
+    hard = ((1 << (bits + 2)) - 1) << (64 - bits - 2)
+    easy = ((1 << (bits - 2)) - 1) << (64 - bits + 2)
+    return hard, easy
+
+
+def _cut_points_python(data, gear: List[int], min_size: int, avg_size: int, max_size: int, final: bool) -> List[int]:
+    hard, easy = _masks(avg_size)
+    cuts = []
+    start = 0
+    n = len(data)
+    while n - start > (0 if final else max_size - 1):
+        if n - start <= min_size:
+            cuts.append(n)
+            break
+        limit = start + min(n - start, max_size)
+        normal = start + min(n - start, avg_size)
+        h = 0
+        # Прогрів вікна: після 64 байтів хеш не залежить від попередніх даних
+        for b in data[start + min_size - 64:start + min_size]:
+            h = ((h << 1) + gear[b]) & _MASK64
+        cut = limit
+        i = start + min_size
+        while i < limit:
+            h = ((h << 1) + gear[data[i]]) & _MASK64
+            i += 1
+            if not h & (hard if i <= normal else easy):
+                cut = i
+                break
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def _cut_points_numpy(data, gear: List[int], min_size: int, avg_size: int, max_size: int, final: bool) -> List[int]:
+    hard, easy = _masks(avg_size)
+    n = len(data)
+    # Хеш 64-байтового вікна в кожній позиції за log2(64) = 6 проходів подвоєння:
+    # H_2w(i) = H_w(i) + (H_w(i - w) << w); позиції з i < 63 ніколи не перевіряються (min_size >= 64)
+    h = np.array(gear, dtype=np.uint64)[np.frombuffer(data, dtype=np.uint8)]
+    w = 1
+    while w < 64:
+        shifted = np.zeros_like(h)
+        shifted[w:] = h[:-w] << np.uint64(w)
+        h += shifted
+        w <<= 1
+    # Кандидати для обох масок; позиція i означає межу після байта i
+    hard_ends = np.flatnonzero((h & np.uint64(hard)) == 0) + 1
+    easy_ends = np.flatnonzero((h & np.uint64(easy)) == 0) + 1
+    cuts = []
+    start = 0
+    while n - start > (0 if final else max_size - 1):
+        if n - start <= min_size:
+            cuts.append(n)
+            break
+        limit = start + min(n - start, max_size)
+        normal = start + min(n - start, avg_size)
+        cut = limit
+        k = np.searchsorted(hard_ends, start + min_size + 1)
+        if k < len(hard_ends) and hard_ends[k] <= normal:
+            cut = int(hard_ends[k])
+        else:
+            k = np.searchsorted(easy_ends, normal + 1)
+            if k < len(easy_ends) and easy_ends[k] <= limit:
+                cut = int(easy_ends[k])
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def iter_chunks(
+    f,
+    gear: List[int],
+    min_size: int = CHUNK_MIN_SIZE,
+    avg_size: int = CHUNK_AVG_SIZE,
+    max_size: int = CHUNK_MAX_SIZE,
+) -> Iterator[bytes]:
+    """Розбиття потоку на частини зі змістовно визначеними межами (Gear, нормалізоване розбиття).
+
+    Межі залежать лише від вмісту поблизу них, тому вставка чи видалення байтів змінює
+    тільки сусідні частини. Результат з NumPy і без нього однаковий.
+    """
+    cut_points = _cut_points_numpy if np is not None else _cut_points_python
+    buf = b""
+    while True:
+        block = f.read(_READ_SIZE)
+        final = not block
+        buf += block
+        if not buf:
+            return
+        start = 0
+        for cut in cut_points(buf, gear, min_size, avg_size, max_size, final):
+            yield buf[start:cut]
+            start = cut
+        buf = buf[start:]
+        if final:
+            return
+
+
+class ChunkStore:
+    """Сховище з дедуплікацією: файли діляться на частини, кожна унікальна частина шифрується один раз.
+
+    Ідентифікатор частини — HMAC-SHA256 її вмісту на ключі сховища; частина шифрується SM4-CTR
+    з нонсом, похідним від ідентифікатора, тому однаковий вміст дає однаковий об'єкт, а при
+    читанні ідентифікатор перевіряється заново. Структура каталогу:
+    config.json, objects/ab/<id>, manifests/<ім'я>.json (символи, недопустимі в імені файлу,
+    і початкова крапка кодуються як %XX).
+    """
+
+    def __init__(
+        self,
+        root: PathLike,
+        key: bytes,
+        engine: str = DEFAULT_ENGINE,
+        min_size: int = CHUNK_MIN_SIZE,
+        avg_size: int = CHUNK_AVG_SIZE,
+        max_size: int = CHUNK_MAX_SIZE,
+    ) -> None:
+        if len(key) != 16:
+            raise ValueError("Ключ SM4 повинен мати довжину 16 байтів (128 біт).")
+        self.root = Path(root)
+        self.engine = engine
+        self._enc_key = _derive(key, b"enc")[:16]
+        self._id_key = _derive(key, b"id")
+        self._gear = gear_table(key)
+        config_path = self.root / "config.json"
+        kcv = key_check_value(self._enc_key, engine).hex()
+        if config_path.exists():
+            config = json.loads(config_path.read_text(encoding="utf-8"))
+            if config.get("version") != STORE_VERSION:
+                raise ValueError(f"Непідтримувана версія сховища: {config.get('version')}.")
+            if config["kcv"] != kcv:
+                raise WrongKeyError("Контрольне значення ключа сховища не збігається — неправильний ключ.")
+            # Параметри розбиття фіксуються при створенні: інакше межі (і дедуплікація) зміняться
+            min_size, avg_size, max_size = config["min_size"], config["avg_size"], config["max_size"]
+        else:
+            if avg_size & (avg_size - 1) or not 64 <= min_size < avg_size < max_size:
+                raise ValueError(
+                    "Некоректні розміри частин: потрібно 64 <= min < avg < max, avg — степінь двійки."
+                )
+            (self.root / "objects").mkdir(parents=True, exist_ok=True)
+            (self.root / "manifests").mkdir(exist_ok=True)
+            _write_atomic(config_path, json.dumps({
+                "version": STORE_VERSION,
+                "kcv": kcv,
+                "min_size": min_size,
+                "avg_size": avg_size,
+                "max_size": max_size,
+            }, indent=2).encode("utf-8"))
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+
+    def chunk_id(self, data: bytes) -> str:
+        return hmac.new(self._id_key, data, hashlib.sha256).hexdigest()
+
+    def _object_path(self, chunk_id: str) -> Path:
+        return self.root / "objects" / chunk_id[:2] / chunk_id[2:]
+
+    def _manifest_path(self, name: str) -> Path:
+        if not name:
+            raise ValueError("Назва запису не може бути порожньою.")
+        encoded = _NAME_UNSAFE_RE.sub(lambda m: urllib.parse.quote(m.group(), safe=""), name)
+        if encoded.startswith("."):
+            # Прихований файл, а також «.» і «..» у ролі імені
+            encoded = "%2E" + encoded[1:]
+        if len(encoded.encode("utf-8")) > _NAME_MAX_BYTES:
+            raise ValueError(f"Назва запису {name!r} задовга.")
+        return self.root / "manifests" / (encoded + ".json")
+
+    def has_chunk(self, chunk_id: str) -> bool:
+        return self._object_path(chunk_id).exists()
+
+    def _write_chunk(self, chunk_id: str, data: bytes) -> None:
+        path = self._object_path(chunk_id)
+        path.parent.mkdir(exist_ok=True)
+        nonce = bytes.fromhex(chunk_id)[:12]
+        _write_atomic(path, sm4_encrypt_ctr(data, self._enc_key, nonce, engine=self.engine))
+
+    def put_chunk(self, data: bytes) -> str:
+        """Збереження частини, якщо її ще немає; повертає ідентифікатор."""
+        chunk_id = self.chunk_id(data)
+        if not self.has_chunk(chunk_id):
+            self._write_chunk(chunk_id, data)
+        return chunk_id
+
+    def get_chunk(self, chunk_id: str) -> bytes:
+        """Читання й розшифрування частини з перевіркою ідентифікатора."""
+        ct = self._object_path(chunk_id).read_bytes()
+        data = sm4_decrypt_ctr(ct, self._enc_key, bytes.fromhex(chunk_id)[:12], engine=self.engine)
+        if not hmac.compare_digest(self.chunk_id(data), chunk_id):
+            raise ValueError(f"Частина {chunk_id} пошкоджена: ідентифікатор не збігається з вмістом.")
+        return data
+
+    def put_file(self, path: PathLike, name: Optional[str] = None) -> Dict[str, int]:
+        """Архівування файлу під назвою name (за замовчуванням — ім'я файлу).
+
+        Шифруються й записуються лише частини, яких ще немає у сховищі. Повертає кількість
+        частин і байтів: усього та нових.
+        """
+        path = Path(path)
+        manifest_path = self._manifest_path(name or path.name)
+        stats = {"chunks": 0, "new_chunks": 0, "bytes": 0, "new_bytes": 0}
+        chunks = []
+        with open(path, "rb") as f:
+            for data in iter_chunks(f, self._gear, self.min_size, self.avg_size, self.max_size):
+                chunk_id = self.chunk_id(data)
+                if not self.has_chunk(chunk_id):
+                    self._write_chunk(chunk_id, data)
+                    stats["new_chunks"] += 1
+                    stats["new_bytes"] += len(data)
+                chunks.append([chunk_id, len(data)])
+                stats["chunks"] += 1
+                stats["bytes"] += len(data)
+        _write_atomic(manifest_path, json.dumps({
+            "version": STORE_VERSION,
+            "size": stats["bytes"],
+            "chunks": chunks,
+        }).encode("utf-8"))
+        return stats
+
+    def get_file(self, name: str, dst: PathLike) -> int:
+        """Відновлення файлу name у dst; повертає кількість записаних байтів."""
+        manifest = self.manifest(name)
+        with open(dst, "wb") as f:
+            for chunk_id, length in manifest["chunks"]:
+                data = self.get_chunk(chunk_id)
+                if len(data) != length:
+                    raise ValueError(f"Частина {chunk_id} має неочікувану довжину.")
+                f.write(data)
+        return manifest["size"]
+
+    def manifest(self, name: str) -> Dict:
+        return json.loads(self._manifest_path(name).read_text(encoding="utf-8"))
+
+    def names(self) -> List[str]:
+        """Назви всіх збережених файлів."""
+        return sorted(urllib.parse.unquote(p.stem) for p in (self.root / "manifests").glob("*.json"))
+
+    def remove(self, name: str) -> None:
+        """Видалення маніфесту; частини звільняє collect_garbage()."""
+        self._manifest_path(name).unlink()
+
+    def collect_garbage(self) -> int:
+        """Видалення частин, на які не посилається жоден маніфест; повертає кількість видалених."""
+        live = set()
+        for name in self.names():
+            live.update(chunk_id for chunk_id, _ in self.manifest(name)["chunks"])
+        removed = 0
+        for path in (self.root / "objects").glob("*/*"):
+            if path.parent.name + path.name not in live:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Запис через тимчасовий файл: перерване архівування не залишає обрізаних об'єктів.
+    # Унікальне ім'я від mkstemp: одночасні записи того самого об'єкта чи маніфесту не змішуються
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".sm4-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, _NEW_FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise